@@ -0,0 +1,164 @@
+import sqlite3
+import hashlib
+import json
+import threading
+import time
+
+# --- Cache Configuration ---
+# Lives next to database.db. It only holds AI responses, so it is safe to delete.
+CACHE_DB_PATH = 'ai_cache.db'
+CACHE_MAX_ENTRIES = 5000
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "errors": 0}
+
+
+def _connect():
+    """Opens a connection to the cache database, creating the table on first use."""
+    global _schema_ready
+    conn = sqlite3.connect(CACHE_DB_PATH, timeout=5)
+    if not _schema_ready:
+        with _schema_lock:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS ai_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_accessed REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            );
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_ai_cache_last_accessed ON ai_cache (last_accessed)')
+            conn.commit()
+            _schema_ready = True
+    return conn
+
+
+def _count(stat, amount=1):
+    with _stats_lock:
+        _stats[stat] += amount
+
+
+def make_key(model_id, messages, max_tokens, temperature):
+    """
+    Builds a content-addressed key for one chat completion request.
+    Identical (model, messages, max_tokens, temperature) always map to the same key.
+    """
+    payload = json.dumps(
+        {"model": model_id, "messages": messages, "max_tokens": max_tokens, "temperature": temperature},
+        sort_keys=True, ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get(key):
+    """Returns the cached value for a key, or None on a miss or an expired entry."""
+    now = time.time()
+    try:
+        conn = _connect()
+        try:
+            row = conn.execute('SELECT value, expires_at FROM ai_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                _count("misses")
+                return None
+            if row[1] <= now:
+                conn.execute('DELETE FROM ai_cache WHERE key = ?', (key,))
+                conn.commit()
+                _count("expired")
+                _count("misses")
+                return None
+            conn.execute(
+                'UPDATE ai_cache SET last_accessed = ?, hit_count = hit_count + 1 WHERE key = ?',
+                (now, key)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"AI cache read error: {e}")
+        _count("errors")
+        return None
+
+    _count("hits")
+    return json.loads(row[0])
+
+
+def put(key, value, ttl):
+    """Stores a JSON-serializable value for ttl seconds, evicting old entries if the cache is full."""
+    now = time.time()
+    encoded = json.dumps(value, ensure_ascii=False)
+    try:
+        conn = _connect()
+        try:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO ai_cache (key, value, size, created_at, expires_at, last_accessed)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (key, encoded, len(encoded), now, now + ttl, now)
+            )
+            _evict(conn, now)
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"AI cache write error: {e}")
+        _count("errors")
+        return
+    _count("stores")
+
+
+def _evict(conn, now):
+    """Drops expired entries, then least-recently-used ones until both size limits hold."""
+    expired = conn.execute('DELETE FROM ai_cache WHERE expires_at <= ?', (now,)).rowcount
+    if expired:
+        _count("expired", expired)
+
+    entries, total_bytes = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ai_cache').fetchone()
+    if entries <= CACHE_MAX_ENTRIES and total_bytes <= CACHE_MAX_BYTES:
+        return
+
+    victims = []
+    for key, size in conn.execute('SELECT key, size FROM ai_cache ORDER BY last_accessed ASC'):
+        if entries <= CACHE_MAX_ENTRIES and total_bytes <= CACHE_MAX_BYTES:
+            break
+        victims.append((key,))
+        entries -= 1
+        total_bytes -= size
+    conn.executemany('DELETE FROM ai_cache WHERE key = ?', victims)
+    _count("evictions", len(victims))
+
+
+def clear():
+    """Removes every cached response."""
+    conn = _connect()
+    try:
+        conn.execute('DELETE FROM ai_cache')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_stats():
+    """Returns hit/miss counters for this process plus the current size of the cache."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    try:
+        conn = _connect()
+        try:
+            stats["entries"], stats["bytes"] = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ai_cache'
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"AI cache stats error: {e}")
+    return stats
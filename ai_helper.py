@@ -1,7 +1,13 @@
 import requests
-import json
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+import ai_cache
+import ai_singleflight
+import ai_schemas
+import ai_usage
 from groq import Groq, RateLimitError, AuthenticationError
-# Note: base64, re, and html imports are removed.
+# Note: base64 and html imports are removed.
 
 # --- !!! PASTE YOUR GROQ API KEY HERE !!! ---
 GROQ_API_KEY = "ADD_YOUR_GROQ_API_KEY_HERE" 
@@ -15,65 +21,360 @@ client = Groq(api_key=GROQ_API_KEY)
 # --- Model Selection (All image models removed) ---
 MODEL_ID_QA = "llama-3.1-8b-instant"
 MODEL_ID_NOTES = "llama-3.3-70b-versatile"
+MODEL_ID_NOTES_CHUNK = "llama-3.1-8b-instant" # Map step for long notes
 MODEL_ID_QUIZ = "llama-3.3-70b-versatile" 
 MODEL_ID_FEEDBACK = "llama-3.1-8b-instant" 
 MODEL_ID_FLASHCARDS = "llama-3.1-8b-instant"
 MODEL_ID_INTERVIEW = "llama-3.3-70b-versatile"
+MODEL_ID_INTERVIEW_SUMMARY = "llama-3.1-8b-instant"
+MODEL_ID_ANSWER_SCORING = "llama-3.1-8b-instant"
 MODEL_ID_EVALUATION = "llama-3.3-70b-versatile"
 MODEL_ID_VISUALIZER = "llama-3.3-70b-versatile"
 
+# --- Response Cache TTLs (seconds, None = never cached) ---
+# Quizzes and coach feedback stay uncached so retries give fresh questions and
+# feedback always reflects the latest history. Diagrams are deterministic enough
+# to keep for a long time.
+CACHE_TTL_QA = 24 * 3600
+CACHE_TTL_NOTES = 7 * 24 * 3600
+CACHE_TTL_QUIZ = None
+CACHE_TTL_FLASHCARDS = 24 * 3600
+CACHE_TTL_DIAGRAM = 30 * 24 * 3600
 
+# Identical requests already in flight share one Groq call. Callers that have
+# waited this long on someone else's call give up with an error.
+COALESCE_TIMEOUT = 60
 
-def query_groq_api(system_prompt, user_prompt, model_id, max_tokens=1024):
+# Structured replies (quizzes, flashcards, evaluations): how many times the
+# missing or invalid part of a reply is asked for again.
+STRUCTURED_RETRIES = 2
+
+# An answer cut off by max_tokens (finish_reason "length") is continued with
+# up to this many follow-up calls instead of being thrown away.
+MAX_CONTINUATIONS = 2
+CONTINUE_PROMPT = "Continue exactly where you stopped. Do not repeat anything and do not add an introduction."
+
+
+
+def query_groq_api(system_prompt, user_prompt, model_id, max_tokens=1024, temperature=0.7, cache_ttl=None, cache_check=None, json_mode=False,
+                   purpose=None, items=1):
     """
     Generic function to query the Groq Chat API for single-turn Q&A.
     """
+    messages_list = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    return query_groq_api_chat(messages_list, model_id, max_tokens, temperature, cache_ttl, cache_check, json_mode, purpose, items)
+
+def query_groq_api_chat(messages_list, model_id, max_tokens=1024, temperature=0.7, cache_ttl=None, cache_check=None, json_mode=False,
+                        purpose=None, items=1):
+    """
+    Generic function to query the Groq Chat API with a full message history.
+    If cache_ttl is set, identical requests are answered from the response cache
+    for that many seconds. cache_check, if given, must return True for a
+    response to be stored (so malformed output is never cached).
+    json_mode asks Groq for a single JSON object (the prompt must mention JSON).
+    Concurrent identical requests are coalesced into a single Groq call.
+    purpose names the caller (e.g. "quiz") for usage logging; with it, max_tokens
+    is only the default and the budget for `items` items comes from measured
+    usage (see ai_usage.py). The cache key always uses the given max_tokens.
+    """
     if GROQ_API_KEY == "PASTE_YOUR_GROQ_API_KEY_HERE" or not GROQ_API_KEY.startswith("gsk_"):
         return {"error": "Groq API Key is not set in ai_helper.py. Please get a free key."}
+
+    request_key = ai_cache.make_key(model_id, messages_list, max_tokens, temperature)
+    if cache_ttl:
+        cached = ai_cache.get(request_key)
+        if cached is not None:
+            return cached
+
+    def call_groq():
+        budget = ai_usage.budget(purpose, max_tokens, items)
+        messages = messages_list # Pass the entire chat history
+        parts = []
+        prompt_tokens = completion_tokens = 0
+        try:
+            for continuation in range(MAX_CONTINUATIONS + 1):
+                response = client.chat.completions.create(
+                    model=model_id,
+                    messages=messages,
+                    temperature=temperature, 
+                    max_tokens=budget,
+                    # A continuation is a fragment, so JSON mode only applies to the first call
+                    **({"response_format": {"type": "json_object"}} if json_mode and continuation == 0 else {})
+                )
+                choice = response.choices[0]
+                parts.append(choice.message.content or "")
+                finish_reason = choice.finish_reason
+                if response.usage is not None:
+                    prompt_tokens += response.usage.prompt_tokens or 0
+                    completion_tokens += response.usage.completion_tokens or 0
+                if finish_reason != "length":
+                    break
+                messages = messages_list + [
+                    {"role": "assistant", "content": "".join(parts)},
+                    {"role": "user", "content": CONTINUE_PROMPT}
+                ]
+            else:
+                print(f"AI answer ({purpose or model_id}) still cut off after {MAX_CONTINUATIONS} continuations.")
+            answer = "".join(parts).strip()
+        except AuthenticationError:
+            return {"error": "Groq Authentication failed. Is your API key correct?"}
+        except RateLimitError:
+            return {"error": "Groq API rate limit exceeded. Please try again in a moment."}
+        except Exception as e:
+            return {"error": f"An unknown error occurred with the AI. ({e})"}
+
+        ai_usage.record(purpose or "other", model_id, items, budget, prompt_tokens, completion_tokens,
+                        finish_reason, continuation)
+        if cache_ttl and answer and (cache_check is None or cache_check(answer)):
+            ai_cache.put(request_key, answer, cache_ttl)
+        return answer
+
     try:
-        response = client.chat.completions.create(
+        return ai_singleflight.do(request_key, call_groq, timeout=COALESCE_TIMEOUT)
+    except TimeoutError:
+        return {"error": "The AI is taking too long to respond. Please try again in a moment."}
+
+def query_groq_api_stream(messages_list, model_id, max_tokens=1024, temperature=0.7, cache_ttl=None):
+    """
+    Streams a chat completion from the Groq API, yielding text chunks as they arrive.
+    On failure a single {"error": ...} dict is yielded instead.
+    Closing the generator early (e.g. the client disconnected) closes the upstream
+    stream, so Groq stops generating tokens nobody will read.
+    Completed answers are stored in the same response cache as query_groq_api_chat.
+    """
+    if GROQ_API_KEY == "PASTE_YOUR_GROQ_API_KEY_HERE" or not GROQ_API_KEY.startswith("gsk_"):
+        yield {"error": "Groq API Key is not set in ai_helper.py. Please get a free key."}
+        return
+
+    cache_key = None
+    if cache_ttl:
+        cache_key = ai_cache.make_key(model_id, messages_list, max_tokens, temperature)
+        cached = ai_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    try:
+        stream = client.chat.completions.create(
             model=model_id,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.7, 
-            max_tokens=max_tokens
+            messages=messages_list,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
         )
-        answer = response.choices[0].message.content
-        return answer.strip()
     except AuthenticationError:
-        return {"error": "Groq Authentication failed. Is your API key correct?"}
+        yield {"error": "Groq Authentication failed. Is your API key correct?"}
+        return
     except RateLimitError:
-        return {"error": "Groq API rate limit exceeded. Please try again in a moment."}
+        yield {"error": "Groq API rate limit exceeded. Please try again in a moment."}
+        return
+    except Exception as e:
+        yield {"error": f"An unknown error occurred with the AI. ({e})"}
+        return
+
+    parts = []
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
     except Exception as e:
-        return {"error": f"An unknown error occurred with the AI. ({e})"}
+        yield {"error": f"The AI stream was interrupted. ({e})"}
+        return
+    finally:
+        stream.close()
+
+    answer = "".join(parts).strip()
+    if cache_key and answer:
+        ai_cache.put(cache_key, answer, cache_ttl)
+
+def generate_items(system_prompt, build_user_prompt, model_id, list_key, item_schema, count, tokens_per_item,
+                   identity_field, cache_ttl=None):
+    """
+    Asks for `count` items as a JSON list under list_key and keeps every valid
+    one. If some are missing or invalid, asks again for only the missing number
+    (up to STRUCTURED_RETRIES times), listing the ones already kept so they are
+    not repeated. build_user_prompt(n) returns the user prompt asking for n items.
+    Returns (items, error); items can be fewer than count if retries ran out.
+    """
+    items = []
+    seen = set()
+    for attempt in range(STRUCTURED_RETRIES + 1):
+        missing = count - len(items)
+        user_prompt = build_user_prompt(missing)
+        if items:
+            user_prompt += "\n\nAlready written (do NOT repeat these):\n" + "\n".join(f"- {item[identity_field]}" for item in items)
+        response = query_groq_api(
+            system_prompt, user_prompt, model_id, max_tokens=tokens_per_item * missing,
+            # Only a complete first reply is cached; top-ups depend on what was kept
+            cache_ttl=cache_ttl if attempt == 0 else None,
+            cache_check=lambda answer: len(ai_schemas.parse_items(answer, list_key, item_schema, None)) >= count,
+            json_mode=True, purpose=list_key, items=missing
+        )
+        if isinstance(response, dict) and "error" in response:
+            return items, (response["error"] if not items else None)
+
+        for item in ai_schemas.parse_items(response, list_key, item_schema, model_id):
+            identity = item[identity_field].casefold()
+            if identity in seen:
+                continue
+            seen.add(identity)
+            items.append(item)
+            if len(items) == count:
+                return items, None
+    return items, None
 
 
 # --- *** ALL YOUR FUNCTIONS (RESTORED) *** ---
 
+DOUBT_SYSTEM_PROMPT = "You are an expert study assistant and tutor. Answer the student's question clearly, concisely, and accurately. Behave like a helpful teacher."
+NOTES_SYSTEM_PROMPT = "You are a world-class note-taking assistant. Summarize the following text into key bullet points or a concise paragraph for a student's review. Focus on the main ideas and important definitions."
+
 def get_ai_doubt_response(question):
     """ Calls the Groq API to answer a student's question. """
-    system_prompt = "You are an expert study assistant and tutor. Answer the student's question clearly, concisely, and accurately. Behave like a helpful teacher."
-    response = query_groq_api(system_prompt, question, MODEL_ID_QA, max_tokens=250)
+    response = query_groq_api(DOUBT_SYSTEM_PROMPT, question, MODEL_ID_QA, max_tokens=250, cache_ttl=CACHE_TTL_QA, purpose="doubt")
     
     if isinstance(response, dict) and "error" in response:
-        return response["error"]
+        return response
     return response
 
 def generate_ai_notes(topic_text):
-    """ Calls the Groq API to summarize text into notes. """
-    system_prompt = "You are a world-class note-taking assistant. Summarize the following text into key bullet points or a concise paragraph for a student's review. Focus on the main ideas and important definitions."
-    response = query_groq_api(system_prompt, topic_text, MODEL_ID_NOTES, max_tokens=400)
+    """ Calls the Groq API to summarize text into notes (long text goes through prepare_notes_input first). """
+    notes_input, error = prepare_notes_input(topic_text)
+    if error:
+        return {"error": error}
+    response = query_groq_api(NOTES_SYSTEM_PROMPT, notes_input, MODEL_ID_NOTES, max_tokens=400, cache_ttl=CACHE_TTL_NOTES, purpose="notes")
     
     if isinstance(response, dict) and "error" in response:
-        return response["error"]
+        return response
     return response
 
-def generate_ai_quiz(topic, num_questions=5, difficulty="Medium", is_late_night=False, is_distracted=False):
+def stream_ai_doubt_response(question):
+    """ Streaming version of get_ai_doubt_response. Yields text chunks. """
+    messages_list = [
+        {"role": "system", "content": DOUBT_SYSTEM_PROMPT},
+        {"role": "user", "content": question}
+    ]
+    return query_groq_api_stream(messages_list, MODEL_ID_QA, max_tokens=250, cache_ttl=CACHE_TTL_QA)
+
+def stream_ai_notes(topic_text):
+    """ Streaming version of generate_ai_notes. Yields text chunks; only the final notes call is streamed. """
+    notes_input, error = prepare_notes_input(topic_text)
+    if error:
+        yield {"error": error}
+        return
+    messages_list = [
+        {"role": "system", "content": NOTES_SYSTEM_PROMPT},
+        {"role": "user", "content": notes_input}
+    ]
+    yield from query_groq_api_stream(messages_list, MODEL_ID_NOTES, max_tokens=400, cache_ttl=CACHE_TTL_NOTES)
+
+# --- Long Notes (Map-Reduce) ---
+# Text longer than one chunk is split at paragraph/sentence boundaries, the
+# chunks are summarized in parallel on a small shared pool (map), and the
+# summaries are summarized again group by group until they fit in one final
+# notes call (reduce). Chunk summaries go through the response cache, which is
+# keyed by content, so re-submitting an edited chapter only re-summarizes the
+# chunks that changed.
+NOTES_CHUNK_TOKENS = 1500
+NOTES_REDUCE_INPUT_TOKENS = 3000    # Largest input for the final notes call
+NOTES_CHUNK_SUMMARY_TOKENS = 200
+NOTES_MAX_REDUCE_LEVELS = 3
+NOTES_MAP_WORKERS = 4
+
+CHUNK_SUMMARY_PROMPT = "You are summarizing one part of a longer text for a student's revision notes. List the key ideas, definitions, formulas and facts in this part as short bullet points. Do not add an introduction or a conclusion."
+
+_notes_executor = ThreadPoolExecutor(max_workers=NOTES_MAP_WORKERS, thread_name_prefix="notes-map")
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+def estimate_tokens(text):
+    """ Rough token count (about 4 characters per token for English). """
+    return len(text) // 4 + 1
+
+def _split_oversized(paragraph, max_tokens):
+    """ Splits an over-budget paragraph into sentences, and over-budget sentences by length. """
+    max_chars = max_tokens * 4
+    pieces = []
+    for sentence in _SENTENCE_END.split(paragraph):
+        while estimate_tokens(sentence) > max_tokens:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+def split_into_chunks(text, max_tokens=NOTES_CHUNK_TOKENS):
+    """
+    Splits text into chunks of at most max_tokens at paragraph (or sentence)
+    boundaries. Besides the size limit, a half-full chunk also ends after any
+    paragraph whose hash marks it as a boundary, so an edit only moves the
+    boundaries near it and the other chunks (and their cached summaries) stay the same.
+    """
+    units = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) > max_tokens:
+            units.extend(_split_oversized(paragraph, max_tokens))
+        else:
+            units.append(paragraph)
+
+    chunks = []
+    current = []
+    size = 0
+    for unit in units:
+        unit_tokens = estimate_tokens(unit)
+        if current and size + unit_tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(unit)
+        size += unit_tokens
+        if size >= max_tokens // 2 and hashlib.sha256(unit.encode('utf-8')).digest()[0] % 4 == 0:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+def _summarize_chunk(chunk):
+    return query_groq_api(
+        CHUNK_SUMMARY_PROMPT, chunk, MODEL_ID_NOTES_CHUNK, max_tokens=NOTES_CHUNK_SUMMARY_TOKENS,
+        cache_ttl=CACHE_TTL_NOTES, purpose="notes_chunk"
+    )
+
+def prepare_notes_input(topic_text):
+    """
+    Returns (text, error): the text for the final notes call. Short text is
+    returned as is; long text is reduced to a merged set of chunk summaries.
+    """
+    chunks = split_into_chunks(topic_text)
+    if len(chunks) <= 1:
+        return topic_text, None
+
+    for _ in range(NOTES_MAX_REDUCE_LEVELS):
+        summaries = list(_notes_executor.map(_summarize_chunk, chunks))
+        for summary in summaries:
+            if isinstance(summary, dict) and "error" in summary:
+                return None, summary["error"]
+        combined = "\n\n".join(summaries)
+        chunks = split_into_chunks(combined)
+        if estimate_tokens(combined) <= NOTES_REDUCE_INPUT_TOKENS or len(chunks) <= 1:
+            break
+    return combined, None
+
+def generate_ai_quiz(topic, num_questions=5, difficulty="Medium", is_late_night=False, is_distracted=False, variation=None):
     """ 
     Calls the Groq API to generate a quiz as a JSON object,
     accounting for the user's focus state.
+    A variation tag asks for a different set of questions than other calls
+    with the same settings (used when pre-generating quizzes for the pool).
     """
     
     if is_late_night:
@@ -119,33 +420,23 @@ The JSON object must follow this exact structure:
 }}
 """
     
-    user_prompt = f"Topic: {topic}\nNumber of Questions: {num_questions}\nDifficulty: {difficulty}"
-    max_quiz_tokens = 200 * num_questions 
-    
-    response_string = query_groq_api(system_prompt_full, user_prompt, MODEL_ID_QUIZ, max_tokens=max_quiz_tokens)
-    
-    if isinstance(response_string, dict) and "error" in response_string:
-        return response_string
+    def build_user_prompt(count):
+        user_prompt = f"Topic: {topic}\nNumber of Questions: {count}\nDifficulty: {difficulty}"
+        if variation:
+            user_prompt += f"\nQuiz Set: {variation} (write questions that differ from other sets on this topic)"
+        return user_prompt
 
-    try:
-        json_string = response_string.strip().lstrip("```json").lstrip("```").rstrip("```")
-        json_start = json_string.find('{')
-        if json_start == -1:
-            raise json.JSONDecodeError("No JSON object found in AI response.", response_string, 0)
-        json_end = json_string.rfind('}')
-        if json_end == -1:
-             raise json.JSONDecodeError("No closing brace for JSON found.", response_string, 0)
-
-        json_string_cleaned = json_string[json_start:json_end+1]
-        quiz_data = json.loads(json_string_cleaned)
-        if "quiz" not in quiz_data or not isinstance(quiz_data["quiz"], list):
-             raise ValueError("JSON response is missing 'quiz' list.")
-        return quiz_data
-        
-    except Exception as e:
-        print(f"Failed to decode AI's JSON response: {e}")
-        print(f"AI returned: {response_string}")
+    questions, error = generate_items(
+        system_prompt_full, build_user_prompt, MODEL_ID_QUIZ, "quiz", ai_schemas.QuizQuestion,
+        num_questions, tokens_per_item=200, identity_field="question", cache_ttl=CACHE_TTL_QUIZ
+    )
+    if error:
+        return {"error": error}
+    if not questions:
         return {"error": "The AI failed to generate a valid quiz. Please try again."}
+    return {"quiz": questions}
+
+COACH_ERROR_PREFIX = "AI Coach Error:"
 
 def get_ai_coach_feedback(quiz_history_text):
     """ Generates personalized coaching feedback based on quiz history. """
@@ -160,9 +451,9 @@ Provide short, motivational, personalized feedback including:
 Be friendly and supportive.
 """
     prompt = f"Here is the student's quiz history:\n\n{quiz_history_text}\n\nGive your analysis."
-    response = query_groq_api(system_prompt, prompt, MODEL_ID_FEEDBACK, max_tokens=250)
+    response = query_groq_api(system_prompt, prompt, MODEL_ID_FEEDBACK, max_tokens=250, purpose="coach_feedback")
     if isinstance(response, dict) and "error" in response:
-        return f"AI Coach Error: {response['error']}"
+        return f"{COACH_ERROR_PREFIX} {response['error']}"
     return response.strip()
 
 def generate_ai_flashcards(topic, num_cards=10):
@@ -181,60 +472,20 @@ The JSON object must follow this exact structure:
   ]
 }}
 """
-    user_prompt = f"Topic: {topic}\nNumber of Flashcards: {num_cards}"
-    max_flashcard_tokens = 75 * num_cards 
-    response_string = query_groq_api(system_prompt, user_prompt, MODEL_ID_FLASHCARDS, max_tokens=max_flashcard_tokens)
-    if isinstance(response_string, dict) and "error" in response_string:
-        return response_string
-    try:
-        json_string = response_string.strip().lstrip("```json").lstrip("```").rstrip("```")
-        json_start = json_string.find('{')
-        if json_start == -1:
-            raise json.JSONDecodeError("No JSON object found in AI response.", json_string, 0)
-        json_end = json_string.rfind('}')
-        if json_end == -1:
-             raise json.JSONDecodeError("No closing brace for JSON found.", response_string, 0)
-        json_string_cleaned = json_string[json_start:json_end+1]
-        flashcard_data = json.loads(json_string_cleaned)
-        if "flashcards" not in flashcard_data or not isinstance(flashcard_data["flashcards"], list):
-             raise ValueError("JSON response is missing 'flashcards' list.")
-        return flashcard_data
-    except Exception as e:
-        print(f"Failed to decode AI's JSON response for flashcards: {e}")
-        print(f"AI returned: {response_string}")
+    flashcards, error = generate_items(
+        system_prompt, lambda count: f"Topic: {topic}\nNumber of Flashcards: {count}", MODEL_ID_FLASHCARDS,
+        "flashcards", ai_schemas.Flashcard, num_cards, tokens_per_item=75, identity_field="front",
+        cache_ttl=CACHE_TTL_FLASHCARDS
+    )
+    if error:
+        return {"error": error}
+    if not flashcards:
         return {"error": "The AI failed to generate valid flashcards. Please try again."}
+    return {"flashcards": flashcards}
 
 # --- *** INTERVIEW BOT FUNCTIONS *** ---
 
-def query_groq_api_chat(messages_list, model_id, max_tokens=1024):
-    """
-    Generic function to query the Groq Chat API with a full message history.
-    """
-    if GROQ_API_KEY == "PASTE_YOUR_GROQ_API_KEY_HERE" or not GROQ_API_KEY.startswith("gsk_"):
-        return {"error": "Groq API Key is not set in ai_helper.py. Please get a free key."}
-
-    try:
-        response = client.chat.completions.create(
-            model=model_id,
-            messages=messages_list, # Pass the entire chat history
-            temperature=0.7, 
-            max_tokens=max_tokens
-        )
-        answer = response.choices[0].message.content
-        return answer.strip()
-    except AuthenticationError:
-        return {"error": "Groq Authentication failed. Is your API key correct?"}
-    except RateLimitError:
-        return {"error": "Groq API rate limit exceeded. Please try again in a moment."}
-    except Exception as e:
-        return {"error": f"An unknown error occurred with the AI. ({e})"}
-
-def get_interview_response(chat_history):
-    """
-    Acts as the AI Interviewer.
-    Takes the full chat history and returns the next question/comment.
-    """
-    system_prompt = """
+INTERVIEW_SYSTEM_PROMPT = """
 You are an expert, stern, and professional interview panelist. 
 Your name is "Dr. Sharma." You are conducting a high-pressure mock interview.
 - NEVER break character. Do not be overly friendly.
@@ -246,11 +497,86 @@ Your name is "Dr. Sharma." You are conducting a high-pressure mock interview.
 - **FOR 'Other' streams:** If the user's first message is "Start the interview.", you MUST ask them what interview they are preparing for (e.g., "Google SWE", "Medical School").
 - **Once they specify the topic (e.g., "Google SWE"),** you must acknowledge it and begin the interview *for that specific topic*. (e.g., "Very well. We will begin the Google SWE interview now...").
 """
-    messages_list = [{"role": "system", "content": system_prompt}] + chat_history
-    response = query_groq_api_chat(messages_list, MODEL_ID_INTERVIEW, max_tokens=300)
+
+def get_interview_response(chat_history):
+    """
+    Acts as the AI Interviewer.
+    Takes the full chat history and returns the next question/comment,
+    or an {"error": ...} dict if the AI call failed.
+    """
+    messages_list = [{"role": "system", "content": INTERVIEW_SYSTEM_PROMPT}] + chat_history
+    return query_groq_api_chat(messages_list, MODEL_ID_INTERVIEW, max_tokens=300, purpose="interview")
+
+def stream_interview_response(chat_history):
+    """ Streaming version of get_interview_response. Yields text chunks. """
+    messages_list = [{"role": "system", "content": INTERVIEW_SYSTEM_PROMPT}] + chat_history
+    return query_groq_api_stream(messages_list, MODEL_ID_INTERVIEW, max_tokens=300)
+
+INTERVIEW_SUMMARY_PROMPT = """
+You keep the running notes for a mock interview panel.
+Update the summary with the new messages. Keep: what the interview is for (e.g. "UPSC", "Google SWE"),
+the topics already covered, the candidate's notable answers, and any weaknesses the panel is probing.
+Write at most 150 words of plain text. Do not add anything that was not said.
+"""
+
+def summarize_interview(previous_summary, messages):
+    """ Folds new interview messages into the running summary (see interview_context.py). Returns text or an error dict. """
+    transcript = "\n".join(
+        f"{'Candidate' if m['role'] == 'user' else 'Interviewer'}: {m.get('content') or ''}" for m in messages
+    )
+    user_prompt = f"Summary so far:\n{previous_summary or '(none yet)'}\n\nNew messages:\n{transcript}"
+    return query_groq_api(INTERVIEW_SUMMARY_PROMPT, user_prompt, MODEL_ID_INTERVIEW_SUMMARY, max_tokens=250,
+                          temperature=0.2, purpose="interview_summary")
+
+ANSWER_SCORING_PROMPT = """
+You are an expert interview evaluator. Score ONE answer from a mock interview.
+- "score_confidence": 0-100, how confident and composed the candidate sounds.
+- "score_clarity": 0-100, how clear, structured and relevant the answer is to the question.
+- "note": one short sentence on the most important strength or weakness of this answer.
+You MUST return a single, valid JSON object: {"score_confidence": 70, "score_clarity": 60, "note": "..."}
+"""
+
+def score_interview_answer(question, answer):
+    """ Scores one candidate answer (run in the background after each turn). Returns a dict or an error dict. """
+    user_prompt = f"Interviewer's question:\n{question}\n\nCandidate's answer:\n{answer}"
+    for _ in range(STRUCTURED_RETRIES + 1):
+        response = query_groq_api(ANSWER_SCORING_PROMPT, user_prompt, MODEL_ID_ANSWER_SCORING, max_tokens=120,
+                                  temperature=0.2, json_mode=True, purpose="answer_scoring")
+        if isinstance(response, dict) and "error" in response:
+            return response
+        scores = ai_schemas.parse_object(response, ai_schemas.InterviewAnswerScore, MODEL_ID_ANSWER_SCORING)
+        if scores is not None:
+            return scores
+    return {"error": "The AI failed to score the answer."}
+
+INTERVIEW_SYNTHESIS_PROMPT = """
+You are an expert interview evaluator. You are given each question of a mock interview with the
+candidate's scores (confidence/clarity, 0-100) and a note on their answer.
+1. Identify the main topic of the interview (e.g., "UPSC", "Google SWE", "Medical School").
+2. Write 3 concise bullet points of constructive feedback.
+3. Write 2 bullet points on strong points.
+You MUST return a single, valid JSON object with this exact structure:
+{"topic": "UPSC", "feedback": ["...", "...", "..."], "strengths": ["...", "..."]}
+"""
+
+def synthesize_interview_feedback(scored_answers):
+    """
+    Turns per-answer scores and notes (dicts with question, score_confidence,
+    score_clarity, note) into the final topic, feedback and strengths. Returns
+    a dict or an error dict.
+    """
+    lines = [
+        f"Q: {answer['question'][:200]}\nScores: {answer['score_confidence']}/{answer['score_clarity']}. Note: {answer['note']}"
+        for answer in scored_answers
+    ]
+    response = query_groq_api(INTERVIEW_SYNTHESIS_PROMPT, "\n\n".join(lines), MODEL_ID_ANSWER_SCORING, max_tokens=300,
+                              json_mode=True, purpose="interview_synthesis")
     if isinstance(response, dict) and "error" in response:
-        return response["error"]
-    return response
+        return response
+    synthesis = ai_schemas.parse_object(response, ai_schemas.InterviewSynthesis, MODEL_ID_ANSWER_SCORING)
+    if synthesis is None:
+        return {"error": "The AI failed to summarize the interview."}
+    return synthesis
 
 def get_interview_evaluation(full_transcript_text):
     """
@@ -283,26 +609,15 @@ The JSON object must follow this exact structure:
 }
 """
     user_prompt = f"Please evaluate this interview transcript:\n\n{full_transcript_text}"
-    response_string = query_groq_api(system_prompt, user_prompt, MODEL_ID_EVALUATION, max_tokens=500)
-    if isinstance(response_string, dict) and "error" in response_string:
-        return response_string
-    try:
-        json_string = response_string.strip().lstrip("```json").lstrip("```").rstrip("```")
-        json_start = json_string.find('{')
-        if json_start == -1:
-            raise json.JSONDecodeError("No JSON object found in AI response.", response_string, 0)
-        json_end = json_string.rfind('}')
-        if json_end == -1:
-             raise json.JSONDecodeError("No closing brace for JSON found.", response_string, 0)
-        json_string_cleaned = json_string[json_start:json_end+1]
-        evaluation_data = json.loads(json_string_cleaned)
-        if "score_confidence" not in evaluation_data or "feedback" not in evaluation_data:
-             raise ValueError("JSON response is missing required keys.")
-        return evaluation_data
-    except Exception as e:
-        print(f"Failed to decode AI's JSON response for evaluation: {e}")
-        print(f"AI returned: {response_string}")
-        return {"error": "The AI failed to generate a valid evaluation. Please try again."}
+    for _ in range(STRUCTURED_RETRIES + 1):
+        response_string = query_groq_api(system_prompt, user_prompt, MODEL_ID_EVALUATION, max_tokens=500, json_mode=True,
+                                         purpose="evaluation")
+        if isinstance(response_string, dict) and "error" in response_string:
+            return response_string
+        evaluation_data = ai_schemas.parse_object(response_string, ai_schemas.InterviewEvaluation, MODEL_ID_EVALUATION)
+        if evaluation_data is not None:
+            return evaluation_data
+    return {"error": "The AI failed to generate a valid evaluation. Please try again."}
 
 # --- *** VISUALIZER FUNCTION (FLOWCHART-ONLY) *** ---
 def generate_ai_diagram(topic):
@@ -341,19 +656,26 @@ graph TD
     
     user_prompt = f"Convert the following topic into Mermaid.js flowchart syntax: {topic}"
     
-    response = query_groq_api(system_prompt, user_prompt, MODEL_ID_VISUALIZER, max_tokens=1024)
+    response = query_groq_api(
+        system_prompt, user_prompt, MODEL_ID_VISUALIZER, max_tokens=1024,
+        cache_ttl=CACHE_TTL_DIAGRAM, cache_check=_is_mermaid_flowchart, purpose="diagram"
+    )
     
     if isinstance(response, dict) and "error" in response:
         return response
 
     # Basic validation to ensure it looks like Mermaid code
-    if "graph TD" not in response and "flowchart TD" not in response:
+    if not _is_mermaid_flowchart(response):
         print(f"AI returned invalid diagram code: {response}")
         return {"error": "The AI failed to generate a valid diagram. It may be too complex."}
 
     # Success! Return the raw Mermaid code.
     return {"mermaid_code": response}
 
+def _is_mermaid_flowchart(response):
+    """ Basic check that the AI returned top-down Mermaid flowchart code. """
+    return "graph TD" in response or "flowchart TD" in response
+
 # --- *** NEW MUSIC FUNCTION (RESTORED) *** ---
 # --- *** REPLACE THIS FUNCTION IN ai_helper.py *** ---
 
@@ -0,0 +1,219 @@
+import sqlite3
+import json
+import threading
+import time
+import uuid
+
+# --- Job Queue Configuration ---
+# Slow AI calls run here instead of on a web worker. The queue is persistent,
+# so queued jobs survive a restart and can be picked up by any app process.
+JOBS_DB_PATH = 'ai_jobs.db'
+JOB_WORKERS = 4
+JOB_POLL_SECONDS = 1.0
+# A running job whose lease expires (worker crashed) is handed to another worker.
+JOB_LEASE_SECONDS = 300
+JOB_MAX_ATTEMPTS = 3
+# Finished jobs (and their results) are kept this long for clients to poll.
+JOB_RESULT_TTL = 3600
+JOB_PURGE_INTERVAL = 60
+
+_handlers = {}
+_workers = []
+_workers_lock = threading.Lock()
+_wake = threading.Event()
+_schema_ready = False
+
+
+def _connect():
+    """Opens an autocommit connection to the jobs database, creating the table on first use."""
+    global _schema_ready
+    conn = sqlite3.connect(JOBS_DB_PATH, timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _schema_ready:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS ai_jobs (
+            id TEXT PRIMARY KEY,
+            job_type TEXT NOT NULL,
+            user_id INTEGER,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            lease_expires REAL
+        );
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_ai_jobs_status_created ON ai_jobs (status, created_at)')
+        _schema_ready = True
+    return conn
+
+
+def register(job_type, handler):
+    """
+    Registers the function that runs jobs of this type.
+    The handler receives the job's params as keyword arguments and returns a
+    JSON-serializable result. A dict with an "error" key marks the job as failed.
+    """
+    _handlers[job_type] = handler
+
+
+def submit(job_type, params, user_id=None):
+    """Queues a job and returns its id immediately."""
+    if job_type not in _handlers:
+        raise ValueError(f"Unknown job type: {job_type}")
+    job_id = uuid.uuid4().hex
+    conn = _connect()
+    try:
+        conn.execute(
+            'INSERT INTO ai_jobs (id, job_type, user_id, params, created_at) VALUES (?, ?, ?, ?, ?)',
+            (job_id, job_type, user_id, json.dumps(params), time.time())
+        )
+    finally:
+        conn.close()
+    start_workers()
+    _wake.set()
+    return job_id
+
+
+def get_job(job_id, user_id=None):
+    """
+    Returns a job's status (and result or error once finished), or None if it
+    does not exist or belongs to another user.
+    """
+    conn = _connect()
+    try:
+        row = conn.execute('SELECT * FROM ai_jobs WHERE id = ?', (job_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None or (user_id is not None and row['user_id'] != user_id):
+        return None
+
+    job = {"job_id": row['id'], "type": row['job_type'], "status": row['status']}
+    if row['status'] == 'done':
+        job['result'] = json.loads(row['result'])
+    elif row['status'] == 'failed':
+        job['error'] = row['error']
+    return job
+
+
+def _claim_next(conn):
+    """Atomically marks the oldest runnable job as running and returns it."""
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(
+            """
+            SELECT id, job_type, params, attempts FROM ai_jobs
+            WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?)
+            ORDER BY created_at
+            LIMIT 1
+            """,
+            (now,)
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                """
+                UPDATE ai_jobs
+                SET status = 'running', attempts = attempts + 1, started_at = ?, lease_expires = ?
+                WHERE id = ?
+                """,
+                (now, now + JOB_LEASE_SECONDS, row['id'])
+            )
+        conn.execute('COMMIT')
+        return row
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def _finish(conn, job_id, status, result=None, error=None):
+    conn.execute(
+        'UPDATE ai_jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires = NULL WHERE id = ?',
+        (status, result, error, time.time(), job_id)
+    )
+
+
+def _run(conn, job):
+    """Runs one claimed job and records its outcome."""
+    handler = _handlers.get(job['job_type'])
+    if handler is None:
+        _finish(conn, job['id'], 'failed', error=f"No handler registered for '{job['job_type']}'.")
+        return
+    if job['attempts'] >= JOB_MAX_ATTEMPTS:
+        _finish(conn, job['id'], 'failed', error="The job was interrupted too many times.")
+        return
+
+    try:
+        result = handler(**json.loads(job['params']))
+        if isinstance(result, dict) and "error" in result:
+            status, result_json, error = 'failed', None, result['error']
+        else:
+            # Serialized here too: a result that isn't valid JSON fails the job, not the worker
+            status, result_json, error = 'done', json.dumps(result), None
+    except Exception as e:
+        print(f"AI job {job['id']} ({job['job_type']}) crashed: {e}")
+        status, result_json, error = 'failed', None, "An unexpected error occurred while processing the request."
+    _finish(conn, job['id'], status, result=result_json, error=error)
+
+
+def purge_finished(conn=None):
+    """Deletes finished jobs older than JOB_RESULT_TTL."""
+    own_conn = conn is None
+    if own_conn:
+        conn = _connect()
+    try:
+        conn.execute(
+            "DELETE FROM ai_jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+            (time.time() - JOB_RESULT_TTL,)
+        )
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def _worker_loop():
+    conn = _connect()
+    last_purge = 0
+    while True:
+        try:
+            if time.time() - last_purge > JOB_PURGE_INTERVAL:
+                purge_finished(conn)
+                last_purge = time.time()
+            job = _claim_next(conn)
+        except sqlite3.Error as e:
+            print(f"AI job queue error: {e}")
+            job = None
+        if job is None:
+            _wake.wait(JOB_POLL_SECONDS)
+            _wake.clear()
+            continue
+        try:
+            _run(conn, job)
+        except sqlite3.Error as e:
+            # The outcome was not recorded; the job is retried once its lease expires
+            print(f"AI job queue error while finishing job {job['id']}: {e}")
+
+
+def start_workers(num_workers=JOB_WORKERS):
+    """Starts the background worker threads for this process (only once)."""
+    with _workers_lock:
+        if _workers:
+            return
+        for i in range(num_workers):
+            worker = threading.Thread(target=_worker_loop, name=f"ai-job-worker-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def get_stats():
+    """Returns the number of jobs in each status."""
+    conn = _connect()
+    try:
+        rows = conn.execute('SELECT status, COUNT(*) AS total FROM ai_jobs GROUP BY status').fetchall()
+    finally:
+        conn.close()
+    return {row['status']: row['total'] for row in rows}
@@ -0,0 +1,219 @@
+import json
+import re
+import threading
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator, model_validator
+
+# --- Structured AI Output ---
+# Schemas for the JSON payloads the AI generates, and a tolerant parser for
+# them. Replies are requested in Groq's JSON mode, but can still arrive wrapped
+# in code fences, with trailing commas, or cut off by max_tokens. The parser
+# repairs what it can, then validates list items one by one so a single bad
+# question doesn't throw away the rest; callers re-request only what's missing.
+
+
+class _Schema(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True, coerce_numbers_to_str=True)
+
+
+class QuizQuestion(_Schema):
+    question: str = Field(min_length=1)
+    options: list[str] = Field(min_length=2, max_length=6)
+    answer_index: int
+
+    @model_validator(mode='before')
+    @classmethod
+    def _answer_text_to_index(cls, data):
+        # Models sometimes give the correct option's text instead of its index
+        if isinstance(data, dict) and 'answer_index' not in data and isinstance(data.get('options'), list):
+            answer = data.get('answer')
+            if answer in data['options']:
+                data = {**data, 'answer_index': data['options'].index(answer)}
+        return data
+
+    @model_validator(mode='after')
+    def _answer_in_range(self):
+        if any(not option for option in self.options):
+            raise ValueError("options must not be empty")
+        if not 0 <= self.answer_index < len(self.options):
+            raise ValueError("answer_index is out of range")
+        return self
+
+
+class Flashcard(_Schema):
+    front: str = Field(min_length=1)
+    back: str = Field(min_length=1)
+
+
+def _clamp_score(value):
+    """Accepts "85%" and 85.5, and keeps a score on the 0-100 scale."""
+    if isinstance(value, str):
+        value = value.strip().rstrip('%')
+    try:
+        value = round(float(value))
+    except (TypeError, ValueError):
+        return value # Let the int validation report it
+    return max(0, min(100, value))
+
+
+class InterviewEvaluation(_Schema):
+    topic: str = "Interview"
+    score_confidence: int
+    score_clarity: int
+    feedback: list[str] = Field(min_length=1)
+    strengths: list[str] = []
+
+    _clamp_scores = field_validator('score_confidence', 'score_clarity', mode='before')(_clamp_score)
+
+
+class InterviewAnswerScore(_Schema):
+    score_confidence: int
+    score_clarity: int
+    note: str = Field(min_length=1)
+
+    _clamp_scores = field_validator('score_confidence', 'score_clarity', mode='before')(_clamp_score)
+
+
+class InterviewSynthesis(_Schema):
+    topic: str = "Interview"
+    feedback: list[str] = Field(min_length=1)
+    strengths: list[str] = []
+
+
+# --- Parse Statistics (per model) ---
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _count(model_id, **amounts):
+    with _stats_lock:
+        model_stats = _stats.setdefault(model_id, {
+            "responses": 0, "clean": 0, "repaired": 0, "failed": 0, "items_valid": 0, "items_dropped": 0
+        })
+        for stat, amount in amounts.items():
+            model_stats[stat] += amount
+
+
+def get_stats():
+    """Per-model counts of clean, repaired and unusable responses, and the failure rate."""
+    with _stats_lock:
+        return {
+            model_id: {**model_stats, "failure_rate": round(model_stats["failed"] / model_stats["responses"], 3)}
+            for model_id, model_stats in _stats.items() if model_stats["responses"]
+        }
+
+
+# --- Repair Parser ---
+
+_TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+
+
+def _close_truncated(text):
+    """
+    For output cut off mid-object: keeps everything up to the last complete
+    value inside a list or object and closes the brackets still open there.
+    Returns None if nothing complete was found.
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    last_complete = None
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]' and stack:
+            stack.pop()
+            if not stack:
+                return text[:i + 1]
+            last_complete = (i + 1, list(stack))
+    if last_complete is None:
+        return None
+    end, still_open = last_complete
+    return text[:end] + ''.join(reversed(still_open))
+
+
+def load_json(text):
+    """
+    Parses a JSON object out of an AI reply, repairing code fences, leading or
+    trailing prose, trailing commas and truncation. Returns (data, repaired);
+    data is None if the reply could not be parsed at all.
+    """
+    if not isinstance(text, str):
+        return None, False
+    try:
+        return json.loads(text), False
+    except ValueError:
+        pass
+
+    start = text.find('{')
+    if start == -1:
+        return None, True
+    candidate = text[start:]
+    end = candidate.rfind('}')
+    for attempt in (candidate[:end + 1] if end != -1 else None, candidate):
+        if attempt is None:
+            continue
+        for fixed in (attempt, _TRAILING_COMMA.sub(r'\1', attempt)):
+            closed = _close_truncated(fixed)
+            if closed is None:
+                continue
+            try:
+                return json.loads(_TRAILING_COMMA.sub(r'\1', closed)), True
+            except ValueError:
+                continue
+    return None, True
+
+
+def parse_items(text, list_key, item_schema, model_id):
+    """
+    Returns the valid items (as dicts) of the list under list_key in an AI
+    reply; invalid items are dropped. Returns [] if nothing was usable.
+    model_id=None parses silently, without logging or counting.
+    """
+    data, repaired = load_json(text)
+    raw_items = data.get(list_key) if isinstance(data, dict) else data
+    if not isinstance(raw_items, list):
+        if model_id:
+            _count(model_id, responses=1, failed=1)
+            print(f"AI reply from {model_id} has no '{list_key}' list: {text!r:.300}")
+        return []
+
+    items = []
+    for raw_item in raw_items:
+        try:
+            items.append(item_schema.model_validate(raw_item).model_dump())
+        except ValidationError as e:
+            if model_id:
+                print(f"Dropped invalid {item_schema.__name__} from {model_id}: {e.errors()[0]['msg']}")
+    dropped = len(raw_items) - len(items)
+    if not model_id:
+        return items
+    if items:
+        _count(model_id, responses=1, items_valid=len(items), items_dropped=dropped,
+               **({"repaired": 1} if repaired or dropped else {"clean": 1}))
+    else:
+        _count(model_id, responses=1, failed=1, items_dropped=dropped)
+    return items
+
+
+def parse_object(text, schema, model_id):
+    """Returns the AI reply validated against schema (as a dict), or None."""
+    data, repaired = load_json(text)
+    try:
+        result = schema.model_validate(data).model_dump()
+    except ValidationError as e:
+        _count(model_id, responses=1, failed=1)
+        print(f"AI reply from {model_id} is not a valid {schema.__name__}: {e.errors()[0]['msg']}")
+        return None
+    _count(model_id, responses=1, **({"repaired": 1} if repaired else {"clean": 1}))
+    return result
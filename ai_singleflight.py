@@ -0,0 +1,64 @@
+import threading
+
+# --- Single-Flight Coalescing ---
+# When several threads ask for the same key at the same time, only the first
+# (the "leader") runs the function. The others wait and share its result, or
+# its exception. Nothing is remembered once the call finishes; that is what
+# ai_cache is for.
+
+_lock = threading.Lock()
+_in_flight = {}
+_stats = {"leaders": 0, "coalesced": 0, "timeouts": 0, "errors": 0}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def do(key, fn, timeout=None):
+    """
+    Runs fn() once per key among concurrent callers and returns its result.
+    Followers wait at most timeout seconds, then raise TimeoutError; the
+    leader keeps running and still delivers to anyone who waits longer.
+    """
+    with _lock:
+        call = _in_flight.get(key)
+        if call is None:
+            call = _Call()
+            _in_flight[key] = call
+            _stats["leaders"] += 1
+            leader = True
+        else:
+            _stats["coalesced"] += 1
+            leader = False
+
+    if leader:
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            with _lock:
+                _stats["errors"] += 1
+        finally:
+            with _lock:
+                del _in_flight[key]
+            call.done.set()
+    elif not call.done.wait(timeout):
+        with _lock:
+            _stats["timeouts"] += 1
+        raise TimeoutError(f"Timed out waiting for an in-flight request ({key}).")
+
+    if call.error is not None:
+        raise call.error
+    return call.result
+
+
+def get_stats():
+    """Returns how many calls ran upstream (leaders) and how many were coalesced onto them."""
+    with _lock:
+        stats = dict(_stats)
+        stats["in_flight"] = len(_in_flight)
+    return stats
@@ -0,0 +1,156 @@
+import math
+import sqlite3
+import threading
+import time
+
+# --- Token Usage and Output Budgets ---
+# Every completed AI answer is logged with its token usage and finish_reason.
+# budget() turns the recent log into a max_tokens value for each purpose
+# ("quiz", "flashcards", ...): the 95th percentile of completion tokens per
+# item, plus headroom, times the number of items asked for. Until a purpose
+# has enough samples, the caller's hard-coded default is used.
+USAGE_DB_PATH = 'ai_usage.db'
+BUDGET_WINDOW = 200         # Most recent answers considered per purpose
+BUDGET_MIN_SAMPLES = 20
+BUDGET_PERCENTILE = 95
+BUDGET_HEADROOM = 1.25
+BUDGET_MIN_TOKENS = 64
+BUDGET_MAX_FACTOR = 2       # Never more than twice the caller's default
+BUDGET_REFRESH_SECONDS = 300
+USAGE_RETENTION_ROWS = 50 * BUDGET_WINDOW
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+_per_item_cache = {}        # purpose -> (per-item tokens or None, computed at)
+_cache_lock = threading.Lock()
+
+
+def _connect():
+    """Opens an autocommit connection to the usage database, creating the table on first use."""
+    global _schema_ready
+    conn = sqlite3.connect(USAGE_DB_PATH, timeout=5, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _schema_ready:
+        with _schema_lock:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS ai_usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                purpose TEXT NOT NULL,
+                model TEXT NOT NULL,
+                items INTEGER NOT NULL,
+                max_tokens INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                finish_reason TEXT,
+                continuations INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            );
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_ai_usage_purpose_id ON ai_usage (purpose, id)')
+            _schema_ready = True
+    return conn
+
+
+def record(purpose, model_id, items, max_tokens, prompt_tokens, completion_tokens, finish_reason, continuations=0):
+    """Logs one answer (summed over its continuation calls). Failures are only printed."""
+    try:
+        conn = _connect()
+        try:
+            cursor = conn.execute(
+                """
+                INSERT INTO ai_usage (purpose, model, items, max_tokens, prompt_tokens, completion_tokens,
+                                      finish_reason, continuations, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (purpose, model_id, max(int(items), 1), max_tokens, prompt_tokens, completion_tokens,
+                 finish_reason, continuations, time.time())
+            )
+            if cursor.lastrowid % 1000 == 0:
+                conn.execute('DELETE FROM ai_usage WHERE id <= ?', (cursor.lastrowid - USAGE_RETENTION_ROWS,))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Could not record AI usage: {e}")
+
+
+def _percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def _recent_per_item(conn, purpose):
+    """Completion tokens per item for the purpose's last BUDGET_WINDOW answers, newest first."""
+    rows = conn.execute(
+        'SELECT completion_tokens, items FROM ai_usage WHERE purpose = ? ORDER BY id DESC LIMIT ?',
+        (purpose, BUDGET_WINDOW)
+    ).fetchall()
+    return [row['completion_tokens'] / row['items'] for row in rows]
+
+
+def _per_item_tokens(purpose):
+    """The purpose's percentile completion tokens per item, or None without enough samples."""
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _per_item_cache.get(purpose)
+        if cached is not None and now - cached[1] < BUDGET_REFRESH_SECONDS:
+            return cached[0]
+
+    per_item = None
+    try:
+        conn = _connect()
+        try:
+            samples = _recent_per_item(conn, purpose)
+        finally:
+            conn.close()
+        if len(samples) >= BUDGET_MIN_SAMPLES:
+            per_item = _percentile(samples, BUDGET_PERCENTILE)
+    except sqlite3.Error as e:
+        print(f"Could not read AI usage: {e}")
+    with _cache_lock:
+        _per_item_cache[purpose] = (per_item, now)
+    return per_item
+
+
+def budget(purpose, default_tokens, items=1):
+    """
+    Returns the max_tokens to request for `items` items of this purpose:
+    measured usage with headroom, kept between BUDGET_MIN_TOKENS and
+    BUDGET_MAX_FACTOR times the default. Falls back to default_tokens.
+    """
+    if not purpose:
+        return default_tokens
+    per_item = _per_item_tokens(purpose)
+    if per_item is None:
+        return default_tokens
+    tokens = math.ceil(per_item * max(int(items), 1) * BUDGET_HEADROOM)
+    return max(BUDGET_MIN_TOKENS, min(tokens, default_tokens * BUDGET_MAX_FACTOR))
+
+
+def get_stats():
+    """Per purpose: answers logged, how many hit the token limit, and the current per-item budget."""
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            """
+            SELECT purpose, COUNT(*) AS answers,
+                   SUM(CASE WHEN finish_reason = 'length' THEN 1 ELSE 0 END) AS truncated,
+                   SUM(CASE WHEN continuations > 0 THEN 1 ELSE 0 END) AS continued,
+                   SUM(prompt_tokens) AS prompt_tokens,
+                   SUM(completion_tokens) AS completion_tokens
+            FROM ai_usage
+            GROUP BY purpose
+            """
+        ).fetchall()
+    finally:
+        conn.close()
+    stats = {}
+    for row in rows:
+        per_item = _per_item_tokens(row['purpose'])
+        stats[row['purpose']] = {
+            **{key: row[key] for key in row.keys() if key != 'purpose'},
+            "budget_per_item": math.ceil(per_item * BUDGET_HEADROOM) if per_item is not None else None,
+        }
+    return stats
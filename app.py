@@ -2,12 +2,32 @@ import sqlite3
 import os
 import random
 import json
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+import hashlib
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template, send_from_directory, abort, request, redirect, url_for, session, flash, jsonify
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 from functools import wraps
 # Assuming 'ai_helper' module exists and provides required functions
 import ai_helper 
+import ai_cache
+import ai_jobs
+import ai_singleflight
+import ai_schemas
+import ai_usage
+import quiz_pool
+import interview_context
+import interview_sessions
+import db
+import migrations
+import rollups
+import search_index
+import media_store
+import badges
+import streaks
+import catalog
+from db import get_db, get_read_db
 from datetime import datetime, date, timedelta
 
 # ----------------------------------------------------------------------
@@ -19,8 +39,21 @@ app = Flask(__name__)
 app.secret_key = 'your_super_secret_key' 
 
 UPLOAD_FOLDER = os.path.join('static', 'uploads')
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mov'} 
+ALLOWED_EXTENSIONS = set(media_store.MEDIA_SIZE_LIMITS)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+app.config['MAX_CONTENT_LENGTH'] = media_store.MAX_REQUEST_BYTES # Larger requests are rejected before they are read
+
+# --- Media Serving Configuration ---
+# Behind nginx, set MEDIA_ACCEL = 'nginx' and map MEDIA_ACCEL_LOCATION to the upload
+# folder as an `internal` location; with Apache/lighttpd mod_xsendfile use 'sendfile'.
+# The proxy then streams the file itself instead of going through Python.
+MEDIA_ACCEL = None
+MEDIA_ACCEL_LOCATION = '/_protected_media/'
+MEDIA_CACHE_SECONDS = 365 * 24 * 3600   # Content-addressed files never change
+LEGACY_MEDIA_CACHE_SECONDS = 3600       # Old uploads named by user and time
+app.config['USE_X_SENDFILE'] = (MEDIA_ACCEL == 'sendfile')
+db.init_app(app)
+migrations.run_migrations(db.DATABASE) # No-op when the schema is already current
 
 # --- External Links Configuration (PYQ) ---
 PYQ_LINKS = {
@@ -47,17 +80,41 @@ PYQ_LINKS = {
 # 2. Helper Functions and Decorators
 # ----------------------------------------------------------------------
 
-def get_db_connection():
-    """Helper function to create a database connection."""
-    conn = sqlite3.connect('database.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
 def allowed_file(filename):
     """Checks if a filename has an allowed extension."""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def sse_response(chunks):
+    """
+    Wraps a text-chunk generator from ai_helper as a Server-Sent Events response.
+    Each chunk is sent as {"delta": "..."}; the stream ends with a 'done' event,
+    or an 'error' event if the AI call fails. If the client disconnects, the
+    server closes this generator, which in turn closes the upstream AI stream.
+    """
+    def event_stream():
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, dict):
+                    yield f"event: error\ndata: {json.dumps(chunk)}\n\n"
+                    return
+                yield f"data: {json.dumps({'delta': chunk})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    response = Response(event_stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Stop nginx from buffering the stream
+    return response
+
+@app.errorhandler(413)
+def request_too_large(error):
+    """Uploads over MAX_CONTENT_LENGTH get a JSON error like the other add_post failures."""
+    limit_mb = media_store.MAX_REQUEST_BYTES // media_store.MB
+    return jsonify({"status": "error", "message": f"Upload is too large (max {limit_mb} MB)."}), 413
+
 def login_required(f):
     """Decorator to protect routes requiring user login."""
     @wraps(f)
@@ -68,63 +125,52 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def calculate_profile_stats(user_id, filter_period='all'):
-    """Fetches and calculates user performance stats for the profile page."""
-    conn = get_db_connection()
-    base_sql = "SELECT q.title, p.score, p.completed_at, p.ai_quiz_topic, p.total_questions, q.subject FROM user_progress p LEFT JOIN quizzes q ON p.quiz_id = q.id WHERE p.user_id = ?"
-    params = [user_id]
-    
-    if filter_period == 'today':
-        base_sql += " AND DATE(p.completed_at) = DATE('now')"
-    elif filter_period == 'week':
-        base_sql += " AND p.completed_at >= DATE('now', '-7 days')"
-    elif filter_period == 'month':
-        base_sql += " AND p.completed_at >= DATE('now', '-30 days')"
-        
-    base_sql += " ORDER BY p.completed_at DESC"
-    
-    progress_rows = conn.execute(base_sql, params).fetchall()
-    conn.close()
-    
-    total_quizzes_taken = len(progress_rows)
-    overall_average = 0
-    temp_subject_data = {}
-    history = []
-    
-    if total_quizzes_taken > 0:
-        total_score_sum = 0
-        total_possible_sum = 0
-        
-        for row in progress_rows:
-            item = dict(row)
-            item['completed_at_formatted'] = datetime.strptime(item['completed_at'], '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d %H:%M')
-            history.append(item)
-            
-            if (row['total_questions'] or 0) > 0:
-                total_score_sum += row['score'] or 0
-                total_possible_sum += row['total_questions'] or 0
-                
-            if row['subject']:
-                subject = row['subject']
-                if subject not in temp_subject_data:
-                    temp_subject_data[subject] = {'score': 0, 'total': 0, 'count': 0}
-                temp_subject_data[subject]['score'] += row['score'] or 0
-                temp_subject_data[subject]['total'] += row['total_questions'] or 0
-                temp_subject_data[subject]['count'] += 1
-                
-        if total_possible_sum > 0:
-            overall_average = int((total_score_sum / total_possible_sum) * 100)
-            
+# --- Keyset Pagination ---
+# Lists are paged by (timestamp, id) instead of OFFSET, so a page costs the same
+# however deep it is and rows inserted meanwhile don't shift the pages.
+MAX_PAGE_SIZE = 100
+CURSOR_START = ('', 0)                                # Sorts before every real (timestamp, id)
+CURSOR_END = ('9999-12-31 23:59:59', 2 ** 63 - 1)     # Sorts after every real (timestamp, id)
+
+def encode_cursor(timestamp, row_id):
+    """Keyset pagination cursor for a row: its timestamp and id."""
+    return f"{timestamp}|{row_id}"
+
+def decode_cursor(cursor):
+    """Returns (timestamp, id) from encode_cursor(), None if no cursor was given. Raises ValueError if malformed."""
+    if not cursor:
+        return None
+    timestamp, _, row_id = cursor.rpartition('|')
+    if not timestamp:
+        raise ValueError("Invalid cursor.")
+    return timestamp, int(row_id)
+
+def get_page_limit(default):
+    """Reads ?limit= from the request, clamped to 1..MAX_PAGE_SIZE."""
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+# --- Profile Stats ---
+# Windows for the profile filter, as DATE('now', modifier) lower bounds on completed_at.
+PROFILE_WINDOWS = {'today': '-0 days', 'week': '-7 days', 'month': '-30 days', 'all': None}
+PROFILE_HISTORY_PAGE_SIZE = 20
+
+def summarize_subjects(subject_rows):
+    """
+    Turns (subject, attempts, scored, possible) rows into the per-subject stats,
+    chart data and weakest subject shown on the dashboard and profile.
+    """
     lagging_area = "N/A"
     lowest_avg = 101
     subject_stats = {}
     subject_labels = []
     subject_data = []
     
-    for subject, data in temp_subject_data.items():
-        if data['total'] > 0:
-            average = round((data['score'] / data['total']) * 100)
-            subject_stats[subject] = {'average': average, 'count': data['count']}
+    for row in subject_rows:
+        subject = row['subject']
+        if row['possible'] > 0:
+            average = round((row['scored'] / row['possible']) * 100)
+            subject_stats[subject] = {'average': average, 'count': row['attempts']}
             subject_labels.append(subject)
             subject_data.append(average)
             if average < lowest_avg:
@@ -133,129 +179,253 @@ def calculate_profile_stats(user_id, filter_period='all'):
         else:
             subject_stats[subject] = {'average': 0, 'count': 0}
             
-    history_text = ""
-    for item in history: 
-        quiz_name = item.get("ai_quiz_topic") or item.get("title") or "Quiz"
-        score = item.get("score", 0)
-        total = item.get("total_questions", 10)
-        date = item.get("completed_at_formatted", "Unknown Date")
-        history_text += f"{quiz_name} – {score}/{total} on {date}\n"
-        
-    if not history_text:
-        history_text = "No quizzes taken for this period."
-        
-    ai_feedback = ai_helper.get_ai_coach_feedback(history_text)
-    
+    return subject_stats, subject_labels, subject_data, lagging_area
+
+def fetch_window_totals(conn, user_id):
+    """Quiz count, score and possible score for every profile window, in one pass over the daily rollups."""
+    row = conn.execute(
+        """
+        SELECT
+            COALESCE(SUM(attempts), 0) AS all_attempts,
+            COALESCE(SUM(scored), 0) AS all_scored,
+            COALESCE(SUM(possible), 0) AS all_possible,
+            COALESCE(SUM(CASE WHEN day >= DATE('now', '-30 days') THEN attempts END), 0) AS month_attempts,
+            COALESCE(SUM(CASE WHEN day >= DATE('now', '-30 days') THEN scored END), 0) AS month_scored,
+            COALESCE(SUM(CASE WHEN day >= DATE('now', '-30 days') THEN possible END), 0) AS month_possible,
+            COALESCE(SUM(CASE WHEN day >= DATE('now', '-7 days') THEN attempts END), 0) AS week_attempts,
+            COALESCE(SUM(CASE WHEN day >= DATE('now', '-7 days') THEN scored END), 0) AS week_scored,
+            COALESCE(SUM(CASE WHEN day >= DATE('now', '-7 days') THEN possible END), 0) AS week_possible,
+            COALESCE(SUM(CASE WHEN day >= DATE('now') THEN attempts END), 0) AS today_attempts,
+            COALESCE(SUM(CASE WHEN day >= DATE('now') THEN scored END), 0) AS today_scored,
+            COALESCE(SUM(CASE WHEN day >= DATE('now') THEN possible END), 0) AS today_possible
+        FROM user_daily_stats
+        WHERE user_id = ?
+        """,
+        (user_id,)
+    ).fetchone()
     return {
-        "total_quizzes_taken": total_quizzes_taken,
+        window: {key: row[f"{window}_{key}"] for key in ('attempts', 'scored', 'possible')}
+        for window in PROFILE_WINDOWS
+    }
+
+def fetch_window_subjects(conn, user_id):
+    """
+    Per-subject rows for every profile window. 'all' comes from the subject rollups;
+    the shorter windows from one grouped query over the last 30 days of attempts.
+    """
+    windows = {window: [] for window in PROFILE_WINDOWS}
+    windows['all'] = rollups.get_subject_stats(conn, user_id)
+    
+    rows = conn.execute(
+        """
+        SELECT
+            q.subject,
+            COUNT(*) AS month_attempts,
+            SUM(CASE WHEN p.total_questions > 0 THEN COALESCE(p.score, 0) ELSE 0 END) AS month_scored,
+            SUM(CASE WHEN p.total_questions > 0 THEN p.total_questions ELSE 0 END) AS month_possible,
+            SUM(CASE WHEN p.completed_at >= DATE('now', '-7 days') THEN 1 ELSE 0 END) AS week_attempts,
+            SUM(CASE WHEN p.completed_at >= DATE('now', '-7 days') AND p.total_questions > 0 THEN COALESCE(p.score, 0) ELSE 0 END) AS week_scored,
+            SUM(CASE WHEN p.completed_at >= DATE('now', '-7 days') AND p.total_questions > 0 THEN p.total_questions ELSE 0 END) AS week_possible,
+            SUM(CASE WHEN p.completed_at >= DATE('now') THEN 1 ELSE 0 END) AS today_attempts,
+            SUM(CASE WHEN p.completed_at >= DATE('now') AND p.total_questions > 0 THEN COALESCE(p.score, 0) ELSE 0 END) AS today_scored,
+            SUM(CASE WHEN p.completed_at >= DATE('now') AND p.total_questions > 0 THEN p.total_questions ELSE 0 END) AS today_possible
+        FROM user_progress p
+        JOIN quizzes q ON p.quiz_id = q.id
+        WHERE p.user_id = ? AND p.completed_at >= DATE('now', '-30 days')
+        GROUP BY q.subject
+        ORDER BY q.subject
+        """,
+        (user_id,)
+    ).fetchall()
+    
+    for row in rows:
+        for window in ('today', 'week', 'month'):
+            if row[f"{window}_attempts"] > 0:
+                windows[window].append({
+                    'subject': row['subject'],
+                    'attempts': row[f"{window}_attempts"],
+                    'scored': row[f"{window}_scored"],
+                    'possible': row[f"{window}_possible"]
+                })
+    return windows
+
+def fetch_progress_history(conn, user_id, filter_period='all', before=None, limit=PROFILE_HISTORY_PAGE_SIZE):
+    """
+    One page of the user's quiz history in a window, newest first.
+    before is a decoded cursor; returns (items, next_cursor or None).
+    """
+    before_at, before_id = before or CURSOR_END
+    rows = conn.execute(
+        """
+        SELECT
+            p.id, q.title, p.score, p.completed_at,
+            strftime('%Y-%m-%d %H:%M', p.completed_at) AS completed_at_formatted,
+            p.ai_quiz_topic, p.total_questions, q.subject
+        FROM user_progress p
+        LEFT JOIN quizzes q ON p.quiz_id = q.id
+        WHERE p.user_id = ?
+          AND p.completed_at >= COALESCE(DATE('now', ?), '')
+          AND p.completed_at <= ?
+          AND (p.completed_at < ? OR p.id < ?)
+        ORDER BY p.completed_at DESC, p.id DESC
+        LIMIT ?
+        """,
+        (user_id, PROFILE_WINDOWS[filter_period], before_at, before_at, before_id, limit + 1)
+    ).fetchall()
+    
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(items[-1]['completed_at'], items[-1]['id'])
+    return items, next_cursor
+
+def build_window_stats(conn, user_id, filter_period, totals, subject_rows, with_feedback=True):
+    """
+    Assembles the profile stats for one window from its totals, subject rows and
+    first history page. ai_feedback is only included (and generated) with_feedback.
+    """
+    overall_average = 0
+    if totals['possible'] > 0:
+        overall_average = int((totals['scored'] / totals['possible']) * 100)
+    subject_stats, subject_labels, subject_data, lagging_area = summarize_subjects(subject_rows)
+    history, history_next_cursor = fetch_progress_history(conn, user_id, filter_period)
+    stats = {
+        "total_quizzes_taken": totals['attempts'],
         "overall_average": overall_average,
         "subject_stats": subject_stats,
         "subject_labels": subject_labels,
         "subject_data": subject_data,
         "lagging_area": lagging_area,
-        "ai_feedback": ai_feedback,
-        "history": history
+        "history": history,
+        "history_next_cursor": history_next_cursor
     }
+    if not with_feedback:
+        return stats
+    
+    # The coach sees the window's totals plus the most recent page of attempts
+    history_lines = []
+    for item in history:
+        quiz_name = item.get("ai_quiz_topic") or item.get("title") or "Quiz"
+        history_lines.append(f"{quiz_name} – {item['score']}/{item['total_questions']} on {item['completed_at_formatted']}")
+        
+    if history_lines:
+        history_text = f"{totals['attempts']} quizzes taken, overall average {overall_average}%.\nMost recent:\n" + "\n".join(history_lines)
+    else:
+        history_text = "No quizzes taken for this period."
+        
+    stats["ai_feedback"] = get_coach_feedback(user_id, f"profile_{filter_period}", history_text)
+    return stats
 
+def calculate_profile_stats(user_id, filter_period='all'):
+    """Fetches and calculates user performance stats for the profile page."""
+    if filter_period not in PROFILE_WINDOWS:
+        filter_period = 'all'
+    conn = get_read_db()
+    totals = fetch_window_totals(conn, user_id)
+    subjects = fetch_window_subjects(conn, user_id)
+    return build_window_stats(conn, user_id, filter_period, totals[filter_period], subjects[filter_period])
+
+def calculate_all_profile_stats(user_id, feedback_window='all'):
+    """
+    Profile stats for every window (today/week/month/all), sharing the two
+    aggregate queries. Only feedback_window gets the AI coach feedback.
+    """
+    conn = get_read_db()
+    totals = fetch_window_totals(conn, user_id)
+    subjects = fetch_window_subjects(conn, user_id)
+    return {
+        window: build_window_stats(conn, user_id, window, totals[window], subjects[window],
+                                   with_feedback=(window == feedback_window))
+        for window in PROFILE_WINDOWS
+    }
+
+# --- AI Coach Feedback (memoized, refreshed in the background) ---
+COACH_FEEDBACK_PLACEHOLDER = "Your AI coach is reviewing your latest progress. Check back in a moment!"
+coach_executor = ThreadPoolExecutor(max_workers=2)
+_coach_refreshing = set()
+_coach_lock = threading.Lock()
 
-def award_badge(user_id, badge_name):
+def get_coach_feedback(user_id, scope, summary_text):
     """
-    Awards a badge to a user by its name, if they don't already have it.
-    Flashes a success message.
+    Returns the user's AI coach feedback for a page ('dashboard', 'profile_all', ...)
+    without waiting on the AI. If the summary changed since the stored feedback
+    was generated (a new quiz was saved), the last good feedback is returned
+    and a fresh one is computed in the background.
     """
-    conn = get_db_connection()
+    digest = hashlib.sha256(summary_text.encode('utf-8')).hexdigest()
+    conn = get_read_db()
+    row = conn.execute(
+        'SELECT input_digest, feedback FROM coach_feedback WHERE user_id = ? AND scope = ?',
+        (user_id, scope)
+    ).fetchone()
+    
+    if row and row['input_digest'] == digest:
+        return row['feedback']
+    
+    key = (user_id, scope)
+    with _coach_lock:
+        if key not in _coach_refreshing:
+            _coach_refreshing.add(key)
+            coach_executor.submit(refresh_coach_feedback, user_id, scope, digest, summary_text)
+            
+    return row['feedback'] if row else COACH_FEEDBACK_PLACEHOLDER
+
+def refresh_coach_feedback(user_id, scope, digest, summary_text):
+    """Generates new coach feedback and stores it. Failed generations keep the old feedback."""
+    conn = get_db() # Runs on a worker thread, so this is that thread's own connection
     try:
-        # 1. Find the badge ID from its name
-        badge = conn.execute('SELECT id, icon, description FROM badges WHERE name = ?', (badge_name,)).fetchone()
-        
-        if not badge:
-            print(f"Warning: A badge with the name '{badge_name}' was not found in the database.")
-            conn.close()
+        feedback = ai_helper.get_ai_coach_feedback(summary_text)
+        if feedback.startswith(ai_helper.COACH_ERROR_PREFIX):
+            print(f"Coach feedback refresh failed for user {user_id}: {feedback}")
             return
-
-        badge_id = badge['id']
-        
-        # 2. Check if the user already has this badge
-        exists = conn.execute(
-            'SELECT 1 FROM user_badges WHERE user_id = ? AND badge_id = ?', 
-            (user_id, badge_id)
-        ).fetchone()
-        
-        # 3. If they don't have it, insert it
-        if not exists:
-            conn.execute(
-                'INSERT INTO user_badges (user_id, badge_id) VALUES (?, ?)',
-                (user_id, badge_id)
-            )
-            conn.commit()
-            
-            # 4. Flash a message to the user!
-            flash_message = f"Badge Earned: {badge_name}! {badge['description']}"
-            flash(flash_message, 'success')
-            print(f"Awarded badge '{badge_name}' to user {user_id}")
-            
+        conn.execute(
+            """
+            INSERT INTO coach_feedback (user_id, scope, input_digest, feedback, updated_at)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id, scope) DO UPDATE SET
+                input_digest = excluded.input_digest,
+                feedback = excluded.feedback,
+                updated_at = excluded.updated_at
+            """,
+            (user_id, scope, digest, feedback)
+        )
+        conn.commit()
     except Exception as e:
-        print(f"Error awarding badge: {e}")
-        conn.rollback() # Roll back any changes if an error occurs
+        conn.rollback()
+        print(f"Error refreshing coach feedback: {e}")
     finally:
-        conn.close()
+        with _coach_lock:
+            _coach_refreshing.discard((user_id, scope))
 
-def check_quiz_badges(user_id):
+def record_study_activity(conn, user_id):
     """
-    Checks for quiz-related badges after a quiz is completed.
-    This runs separately to not interfere with route-specific connections.
+    Marks today as a study day (a finished quiz or completed task), in the
+    caller's transaction. Returns (current streak, newly earned badges).
     """
-    conn = get_db_connection()
-    try:
-        # Get total number of quizzes taken
-        quiz_count_row = conn.execute(
-            'SELECT COUNT(*) FROM user_progress WHERE user_id = ?', 
-            (user_id,)
-        ).fetchone()
-        
-        quiz_count = quiz_count_row[0] if quiz_count_row else 0
-        
-        # Award 'Quiz Taker' (first quiz)
-        if quiz_count >= 1:
-            award_badge(user_id, 'Quiz Taker')
-            
-        # Award 'Quiz Master' (10 quizzes)
-        if quiz_count >= 10:
-            award_badge(user_id, 'Quiz Master')
-            
-    except Exception as e:
-        print(f"Error checking quiz badges: {e}")
-    finally:
-        conn.close()
+    current_streak = streaks.record_activity(conn, user_id)
+    awarded = badges.record_max(conn, user_id, 'best_streak', current_streak)
+    return current_streak, awarded
+
+def flash_badges(awarded):
+    """Flashes a message for each badge the badge engine just awarded. Call after the commit."""
+    for rule in awarded:
+        flash(f"Badge Earned: {rule['badge']}! {rule['description']}", 'success')
 
 def get_confidence_heatmap(user_id):
     """
     Calculates the user's average score for every AI quiz topic.
     Returns a list of topics and their confidence score (0-100).
     """
-    conn = get_db_connection()
+    conn = get_read_db()
     heatmap_data = []
     try:
-        query = """
-        SELECT
-            ai_quiz_topic,
-            SUM(score) AS total_scored,
-            SUM(total_questions) AS total_possible,
-            (SUM(score) * 100.0 / SUM(total_questions)) AS confidence
-        FROM user_progress
-        WHERE user_id = ? AND ai_quiz_topic IS NOT NULL
-        GROUP BY ai_quiz_topic
-        ORDER BY confidence DESC
-        """
-        rows = conn.execute(query, (user_id,)).fetchall()
+        rows = rollups.get_topic_stats(conn, user_id)
         
         for row in rows:
             heatmap_data.append(dict(row))
             
     except Exception as e:
         print(f"Error generating heatmap: {e}")
-    finally:
-        conn.close()
         
     return heatmap_data
 
@@ -279,18 +449,16 @@ def register():
         hashed_password = generate_password_hash(password)
         
         try:
-            conn = get_db_connection()
+            conn = get_db()
             cursor = conn.execute(
                 'INSERT INTO users (username, email, password_hash, exam_group) VALUES (?, ?, ?, ?)',
                 (username, email, hashed_password, exam_group)
             )
+            # Awards 'First Steps' in the same transaction
+            awarded = badges.increment(conn, cursor.lastrowid, 'registered')
             conn.commit()
-            
-            # Award 'First Steps' badge
-            new_user_id = cursor.lastrowid 
-            award_badge(new_user_id, 'First Steps') 
+            flash_badges(awarded)
 
-            conn.close()
             flash('Registration successful! Please log in.', 'success')
             return redirect(url_for('login'))
         except sqlite3.IntegrityError:
@@ -305,9 +473,8 @@ def login():
         username = request.form['username']
         password = request.form['password']
         
-        conn = get_db_connection()
+        conn = get_read_db()
         user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        conn.close()
         
         if user and check_password_hash(user['password_hash'], password):
             session['user_id'] = user['id']
@@ -334,102 +501,49 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    conn = get_db_connection()
+    conn = get_read_db()
     user_row = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
     if user_row is None:
-        conn.close()
         return redirect(url_for('logout'))
         
     user = dict(user_row)
     
-    # --- Streak Check and Update ---
-    today_str = date.today().isoformat()
-    yesterday_str = (date.today() - timedelta(days=1)).isoformat()
-    last_activity_date = user.get('last_activity_date')
-    current_streak = user.get('current_streak', 0)
+    # A streak whose last day was before yesterday has lapsed; the nightly rollover resets it in the table
+    current_streak = streaks.effective_streak(user.get('current_streak'), user.get('last_activity_date'))
     
     heatmap_data = get_confidence_heatmap(session['user_id'])
-
-    # Reset streak if the last activity was before yesterday
-    if last_activity_date != today_str and last_activity_date != yesterday_str:
-        if current_streak > 0:
-            conn.execute('UPDATE users SET current_streak = 0 WHERE id = ?', (session['user_id'],))
-            conn.commit()
-        current_streak = 0
     
     # --- Dashboard Content Logic ---
     today_iso = date.today().isoformat()
+    tomorrow_iso = (date.today() + timedelta(days=1)).isoformat()
+    # A range on the ISO start_time string (rather than DATE(start_time)) can use the schedule index
     today_events_rows = conn.execute(
-        'SELECT id, title, is_complete FROM schedule WHERE user_id = ? AND DATE(start_time) = ?',
-        (session['user_id'], today_iso)
+        'SELECT id, title, is_complete FROM schedule WHERE user_id = ? AND start_time >= ? AND start_time < ?',
+        (session['user_id'], today_iso, tomorrow_iso)
     ).fetchall()
     today_events = [dict(row) for row in today_events_rows]
     total_tasks = len(today_events)
     completed_tasks = sum(1 for task in today_events if task['is_complete'])
     progress_percent = int((completed_tasks / total_tasks) * 100) if total_tasks > 0 else 0
     
-    all_progress_rows = conn.execute(
-        'SELECT score, total_questions, completed_at FROM user_progress WHERE user_id = ? ORDER BY completed_at ASC',
-        (session['user_id'],)
-    ).fetchall()
-    
-    total_quizzes_taken = len(all_progress_rows)
+    # Totals, the score trend and subject averages all come from the stats rollups
+    totals = rollups.get_totals(conn, session['user_id'])
+    total_quizzes_taken = totals['attempts']
     overall_average = 0
+    if totals['possible'] > 0:
+        overall_average = int((totals['scored'] / totals['possible']) * 100)
+        
+    # Trend chart: average score per day over the last 10 days with quizzes
     chart_labels = []
     chart_data = []
+    for row in rollups.get_recent_days(conn, session['user_id'], 10):
+        chart_data.append(round((row['scored'] / row['possible']) * 100))
+        chart_labels.append(datetime.strptime(row['day'], '%Y-%m-%d').strftime('%b %d'))
     
-    if total_quizzes_taken > 0:
-        total_score_sum = 0
-        total_possible_sum = 0
-        for row in all_progress_rows:
-            if (row['total_questions'] or 0) > 0:
-                total_score_sum += row['score'] or 0
-                total_possible_sum += row['total_questions'] or 0
-                
-                percent = round(((row['score'] or 0) / row['total_questions']) * 100)
-                chart_data.append(percent)
-                date_obj = datetime.strptime(row['completed_at'], '%Y-%m-%d %H:%M:%S')
-                chart_labels.append(date_obj.strftime('%b %d'))
-                
-        if total_possible_sum > 0:
-            overall_average = int((total_score_sum / total_possible_sum) * 100)
-            
-    chart_labels = chart_labels[-10:]
-    chart_data = chart_data[-10:]
-    
-    subject_progress_rows = conn.execute(
-        'SELECT p.score, p.total_questions, q.subject FROM user_progress p JOIN quizzes q ON p.quiz_id = q.id WHERE p.user_id = ? AND p.quiz_id IS NOT NULL',
-        (session['user_id'],)
-    ).fetchall()
-    
-    temp_subject_data = {}
-    for row in subject_progress_rows:
-        subject = row['subject']
-        if subject not in temp_subject_data:
-            temp_subject_data[subject] = {'score': 0, 'total': 0, 'count': 0}
-        temp_subject_data[subject]['score'] += row['score'] or 0
-        temp_subject_data[subject]['total'] += row['total_questions'] or 0
-        temp_subject_data[subject]['count'] += 1
-        
-    lagging_area = "N/A"
-    lowest_avg = 101
-    subject_stats = {}
-    subject_labels = []
-    subject_data = []
+    subject_stats, subject_labels, subject_data, lagging_area = summarize_subjects(
+        rollups.get_subject_stats(conn, session['user_id'])
+    )
     
-    for subject, data in temp_subject_data.items():
-        if data['total'] > 0:
-            average = round((data['score'] / data['total']) * 100)
-            subject_stats[subject] = {'average': average, 'count': data['count']}
-            subject_labels.append(subject)
-            subject_data.append(average)
-            
-            if average < lowest_avg:
-                lowest_avg = average
-                lagging_area = subject
-        else:
-             subject_stats[subject] = {'average': 0, 'count': 0}
-             
     # AI Feedback for Dashboard (based on trend)
     trend_summary = f"User's overall average is {overall_average}%.\n"
     trend_summary += "Here are their recent quiz scores (performance trend):\n"
@@ -439,13 +553,11 @@ def dashboard():
         recent_scores = [f"On {label}, score was {score}%" for label, score in zip(chart_labels, chart_data)]
         trend_summary += "\n".join(recent_scores)
         
-    ai_feedback = ai_helper.get_ai_coach_feedback(trend_summary)
+    ai_feedback = get_coach_feedback(session['user_id'], 'dashboard', trend_summary)
     
     exam_group = session.get('exam_group', 'Other')
     pyq_links = PYQ_LINKS.get(exam_group, PYQ_LINKS['Other'])
     
-    conn.close() 
-    
     return render_template('dashboard.html', 
         user=user, 
         current_streak=current_streak, 
@@ -469,41 +581,35 @@ def dashboard():
 @app.route('/quizzes')
 @login_required
 def quiz_list():
-    conn = get_db_connection()
-    quizzes = conn.execute('SELECT * FROM quizzes').fetchall()
-    conn.close()
-    return render_template('quiz_list.html', quizzes=quizzes)
+    return render_template('quiz_list.html', quizzes=catalog.get_quizzes())
 
 @app.route('/quiz/<int:quiz_id>')
 @login_required
 def quiz(quiz_id):
-    conn = get_db_connection()
-    quiz = conn.execute('SELECT * FROM quizzes WHERE id = ?', (quiz_id,)).fetchone()
-    questions = conn.execute('SELECT * FROM questions WHERE quiz_id = ?', (quiz_id,)).fetchall()
-    conn.close()
+    quiz = catalog.get_quiz(quiz_id)
     if quiz is None:
         flash('Quiz not found.', 'danger')
         return redirect(url_for('quiz_list'))
-    return render_template('quiz.html', quiz=quiz, questions=questions)
+    return render_template('quiz.html', quiz=quiz, questions=catalog.get_questions(quiz_id))
 
 @app.route('/submit_quiz/<int:quiz_id>', methods=['POST'])
 @login_required
 def submit_quiz(quiz_id):
-    conn = get_db_connection()
-    quiz = conn.execute('SELECT * FROM quizzes WHERE id = ?', (quiz_id,)).fetchone()
+    quiz = catalog.get_quiz(quiz_id)
     if quiz is None:
         flash('Quiz not found.', 'danger')
-        conn.close()
         return redirect(url_for('quiz_list'))
         
-    questions = conn.execute('SELECT * FROM questions WHERE quiz_id = ?', (quiz_id,)).fetchall()
+    # Graded from the in-memory catalog; the database is only touched to save the result
+    questions = catalog.get_questions(quiz_id)
+    answer_key = catalog.get_answer_key(quiz_id)
     score = 0
     total_questions = len(questions)
     results = []
     
     for question in questions:
         submitted_answer = request.form.get(f"question_{question['id']}") 
-        is_correct = (submitted_answer == question['correct_answer'])
+        is_correct = (submitted_answer == answer_key[question['id']])
         
         if is_correct:
             score += 1
@@ -511,32 +617,33 @@ def submit_quiz(quiz_id):
         results.append({
             'question_text': question['question_text'],
             'submitted_answer': submitted_answer,
-            'correct_answer': question['correct_answer'],
+            'correct_answer': answer_key[question['id']],
             'is_correct': is_correct
         })
         
     points_awarded = score * 10
     
+    conn = get_db()
     try:
         conn.execute(
             'INSERT INTO user_progress (user_id, quiz_id, score, total_questions) VALUES (?, ?, ?, ?)',
             (session['user_id'], quiz_id, score, total_questions)
         )
+        rollups.record_attempt(conn, session['user_id'], score, total_questions, subject=quiz['subject'])
         conn.execute(
             'UPDATE users SET points = points + ? WHERE id = ?',
             (points_awarded, session['user_id'])
         )
+        awarded = badges.increment(conn, session['user_id'], 'quizzes_completed')
+        awarded += record_study_activity(conn, session['user_id'])[1]
         conn.commit()
     except Exception as e:
         conn.rollback()
+        awarded = []
         flash(f'An error occurred while saving your score: {e}', 'danger')
-    finally:
-        conn.close()
         
     flash(f'Quiz submitted! You scored {score} out of {total_questions} and earned {points_awarded} points!', 'success')
-    
-    # Check for quiz badges
-    check_quiz_badges(session['user_id'])
+    flash_badges(awarded)
     
     return render_template('quiz_results.html', quiz=quiz, results=results, score=score, total_questions=total_questions)
 
@@ -558,16 +665,41 @@ def api_ask_doubt():
     answer = ai_helper.get_ai_doubt_response(question)
     return jsonify({"answer": answer})
 
+@app.route('/api/ask_doubt/stream', methods=['POST'])
+@login_required
+def api_ask_doubt_stream():
+    """Same as /api/ask_doubt, but streams the answer as Server-Sent Events."""
+    data = request.get_json()
+    if not data or 'question' not in data:
+        return jsonify({"error": "No question provided."}), 400
+    return sse_response(ai_helper.stream_ai_doubt_response(data['question']))
+
 @app.route('/api/generate_notes', methods=['POST'])
 @login_required
 def api_generate_notes():
-    data = request.get_json()
-    if 'topic' not in data:
-        return jsonify({"error": "No topic text provided."}), 400
-    topic_text = data['topic']
-    notes = ai_helper.generate_ai_notes(topic_text)
+    params, error = parse_notes_request(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+    notes = ai_helper.generate_ai_notes(params['topic_text'])
+    if isinstance(notes, dict) and "error" in notes:
+        return jsonify(notes), 500
     return jsonify({"notes": notes})
 
+@app.route('/api/generate_notes/stream', methods=['POST'])
+@login_required
+def api_generate_notes_stream():
+    """Same as /api/generate_notes, but streams the notes as Server-Sent Events."""
+    params, error = parse_notes_request(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+    return sse_response(ai_helper.stream_ai_notes(params['topic_text']))
+
+def parse_notes_request(data):
+    """Validates a notes request. Returns (params, error_message)."""
+    if not data or 'topic' not in data:
+        return None, "No topic text provided."
+    return {"topic_text": data['topic']}, None
+
 @app.route('/quiz_generator')
 @login_required
 def quiz_generator():
@@ -576,9 +708,28 @@ def quiz_generator():
 @app.route('/api/generate_quiz', methods=['POST'])
 @login_required
 def api_generate_quiz():
-    data = request.get_json()
+    params, error = parse_quiz_request(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+    
+    quiz_data = get_ai_quiz(params)
+    
+    if "error" in quiz_data:
+        return jsonify(quiz_data), 500
+        
+    return jsonify(quiz_data)
+
+def get_ai_quiz(params):
+    """Serves a pre-generated quiz from the pool when one is ready, otherwise generates it now."""
+    quiz_data = quiz_pool.take(**params)
+    if quiz_data is None:
+        quiz_data = ai_helper.generate_ai_quiz(**params)
+    return quiz_data
+
+def parse_quiz_request(data):
+    """Validates an AI quiz request. Returns (params, error_message)."""
     if not data or 'topic' not in data or 'num_questions' not in data:
-        return jsonify({"error": "Missing topic or number of questions."}), 400
+        return None, "Missing topic or number of questions."
         
     topic = data['topic']
     
@@ -595,18 +746,13 @@ def api_generate_quiz():
     is_late_night = data.get('is_late_night', False) 
     is_distracted = data.get('is_distracted', False)
     
-    quiz_data = ai_helper.generate_ai_quiz(
-        topic, 
-        num_questions, 
-        difficulty, 
-        is_late_night,
-        is_distracted
-    )
-    
-    if "error" in quiz_data:
-        return jsonify(quiz_data), 500
-        
-    return jsonify(quiz_data)
+    return {
+        "topic": topic,
+        "num_questions": num_questions,
+        "difficulty": difficulty,
+        "is_late_night": is_late_night,
+        "is_distracted": is_distracted
+    }, None
 
 @app.route('/api/save_ai_quiz_score', methods=['POST'])
 @login_required
@@ -615,24 +761,20 @@ def save_ai_quiz_score():
     if not data or 'topic' not in data or 'score' not in data or 'total' not in data:
         return jsonify({"status": "error", "message": "Missing data."}), 400
     try:
-        conn = get_db_connection()
+        conn = get_db()
         conn.execute(
             'INSERT INTO user_progress (user_id, ai_quiz_topic, score, total_questions) VALUES (?, ?, ?, ?)',
             (session['user_id'], data['topic'], data['score'], data['total'])
         )
+        rollups.record_attempt(conn, session['user_id'], data['score'], data['total'], topic=data['topic'])
+        awarded = badges.increment(conn, session['user_id'], 'quizzes_completed')
+        awarded += record_study_activity(conn, session['user_id'])[1]
         conn.commit()
-        conn.close()
-        
-        # Check for quiz badges
-        check_quiz_badges(session['user_id'])
+        flash_badges(awarded)
         
         return jsonify({"status": "success", "message": "Score saved."})
     except Exception as e:
         conn.rollback()
-        conn.close()
-        
-        check_quiz_badges(session['user_id']) 
-        
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
@@ -646,12 +788,11 @@ def schedule():
 @app.route('/api/get_events')
 @login_required
 def get_events():
-    conn = get_db_connection()
+    conn = get_read_db()
     events_rows = conn.execute(
         'SELECT id, title, start_time AS start, end_time AS end, is_complete FROM schedule WHERE user_id = ?',
         (session['user_id'],)
     ).fetchall()
-    conn.close()
     events = [dict(row) for row in events_rows]
     return jsonify(events)
 
@@ -662,17 +803,15 @@ def add_event():
     if not data or 'title' not in data or 'start' not in data:
         return jsonify({"status": "error", "message": "Missing title or start date"}), 400
     try:
-        conn = get_db_connection()
+        conn = get_db()
         conn.execute(
             'INSERT INTO schedule (user_id, title, start_time, end_time) VALUES (?, ?, ?, ?)',
             (session['user_id'], data['title'], data['start'], data.get('end'))
         )
         conn.commit()
-        conn.close()
         return jsonify({"status": "success", "message": "Event added successfully"})
     except Exception as e:
         conn.rollback()
-        conn.close()
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/api/delete_event', methods=['POST'])
@@ -682,20 +821,18 @@ def delete_event():
     if not data or 'id' not in data:
         return jsonify({"status": "error", "message": "Invalid data, missing event ID."}), 400
     try:
-        conn = get_db_connection()
+        conn = get_db()
         result = conn.execute(
             'DELETE FROM schedule WHERE id = ? AND user_id = ?',
             (data['id'], session['user_id'])
         )
         conn.commit()
-        conn.close()
         if result.rowcount == 0:
             return jsonify({"status": "error", "message": "Event not found or permission denied."}), 404
         else:
             return jsonify({"status": "success", "message": "Event deleted."})
     except Exception as e:
         conn.rollback()
-        conn.close()
         return jsonify({"status": "error", "message": str(e)}), 500
         
 @app.route('/api/toggle_task', methods=['POST'])
@@ -706,7 +843,7 @@ def toggle_task():
         return jsonify({"status": "error", "message": "Invalid data."}), 400
     task_id = data['task_id']
     is_complete = data['is_complete']
-    conn = get_db_connection()
+    conn = get_db()
     try:
         # Update task completion status
         conn.execute(
@@ -715,50 +852,17 @@ def toggle_task():
         )
         new_streak = 0
         
-        # Streak Update Logic (only if task is completed)
+        # Completing a task counts as study activity for the streak
         if is_complete:
-            today_str = date.today().isoformat()
-            yesterday_str = (date.today() - timedelta(days=1)).isoformat()
-            user = conn.execute('SELECT last_activity_date, current_streak FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-            
-            if user['last_activity_date'] == today_str:
-                new_streak = user['current_streak']
-            elif user['last_activity_date'] == yesterday_str:
-                new_streak = user['current_streak'] + 1
-                conn.execute(
-                    'UPDATE users SET current_streak = ?, last_activity_date = ? WHERE id = ?',
-                    (new_streak, today_str, session['user_id'])
-                )
-            else:
-                new_streak = 1
-                conn.execute(
-                    'UPDATE users SET current_streak = 1, last_activity_date = ? WHERE id = ?',
-                    (today_str, session['user_id'])
-                )
-            
-            # --- *** ADDED BADGE LOGIC *** ---
-            if new_streak >= 3:
-                badge = conn.execute('SELECT id FROM badges WHERE name = ?', ('Streak Starter',)).fetchone()
-                if badge:
-                    exists = conn.execute(
-                        'SELECT 1 FROM user_badges WHERE user_id = ? AND badge_id = ?',
-                        (session['user_id'], badge['id'])
-                    ).fetchone()
-                    
-                    if not exists:
-                        conn.execute(
-                            'INSERT INTO user_badges (user_id, badge_id) VALUES (?, ?)',
-                            (session['user_id'], badge['id'])
-                        )
-                        flash("Badge Earned: Streak Starter! Achieved a 3-day study streak", 'success')
-            # --- *** END OF BADGE LOGIC *** ---
+            new_streak, awarded = record_study_activity(conn, session['user_id'])
+        else:
+            awarded = []
 
         conn.commit()
-        conn.close()
+        flash_badges(awarded)
         return jsonify({"status": "success", "new_streak": new_streak})
     except Exception as e:
         conn.rollback()
-        conn.close()
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
@@ -770,57 +874,177 @@ def community():
     exam_group = session.get('exam_group', 'Other')
     return render_template('community.html', exam_group=exam_group)
 
+FEED_PAGE_SIZE = 20
+REPLIES_PAGE_SIZE = 50
+REPLY_PREVIEW_COUNT = 3
+
+def attach_reply_previews(conn, posts):
+    """
+    Adds the first REPLY_PREVIEW_COUNT replies of every post in the page, fetched
+    in one query, plus a replies_cursor to load the rest from /api/get_replies.
+    """
+    for post in posts:
+        post['replies'] = []
+        post['replies_cursor'] = None
+    if not posts:
+        return posts
+    
+    by_id = {post['id']: post for post in posts}
+    placeholders = ", ".join("?" * len(by_id))
+    reply_rows = conn.execute(
+        f"""
+        SELECT id, parent_post_id, content, media_url, created_at, user_id, username
+        FROM (
+            SELECT
+                r.id, r.parent_post_id, r.content, r.media_url, r.created_at, r.user_id, u.username,
+                ROW_NUMBER() OVER (PARTITION BY r.parent_post_id ORDER BY r.created_at, r.id) AS position
+            FROM posts r
+            JOIN users u ON r.user_id = u.id
+            WHERE r.parent_post_id IN ({placeholders})
+        )
+        WHERE position <= ?
+        ORDER BY parent_post_id, created_at, id
+        """,
+        (*by_id, REPLY_PREVIEW_COUNT)
+    ).fetchall()
+    
+    for row in reply_rows:
+        reply = dict(row)
+        post = by_id[reply.pop('parent_post_id')]
+        post['replies'].append(reply)
+        post['replies_cursor'] = encode_cursor(reply['created_at'], reply['id'])
+    return posts
+
 @app.route('/api/get_posts')
 @login_required
 def get_posts():
+    """
+    Top-level posts in a channel, newest first, one page at a time. Each post
+    carries its reply_count and its first few replies (see attach_reply_previews).
+      ?channel=general                 newest page
+      &before=<next_cursor>            the next (older) page
+      &after=<newest_cursor>           only posts newer than the last poll
+      &limit=20                        page size (max MAX_PAGE_SIZE)
+    """
     channel = request.args.get('channel')
     exam_group = session.get('exam_group', 'Other') 
     
     if not channel:
         return jsonify({"error": "Channel not specified."}), 400
-
-    conn = get_db_connection()
+    try:
+        before = decode_cursor(request.args.get('before'))
+        after = decode_cursor(request.args.get('after'))
+    except ValueError:
+        return jsonify({"error": "Invalid cursor."}), 400
+    limit = get_page_limit(FEED_PAGE_SIZE)
+
+    conn = get_read_db()
+    if after:
+        # Polling: the oldest `limit` posts newer than the cursor, so repeated polls catch up in order
+        after_at, after_id = after
+        post_rows = conn.execute(
+            """
+            SELECT p.id, p.content, p.media_url, p.created_at, p.user_id, p.reply_count, u.username
+            FROM posts p
+            JOIN users u ON p.user_id = u.id
+            WHERE p.exam_group = ? AND p.channel = ? AND p.parent_post_id IS NULL
+              AND p.created_at >= ? AND (p.created_at > ? OR p.id > ?)
+            ORDER BY p.created_at ASC, p.id ASC
+            LIMIT ?
+            """,
+            (exam_group, channel, after_at, after_at, after_id, limit + 1)
+        ).fetchall()
+        has_more = len(post_rows) > limit
+        posts = attach_reply_previews(conn, [dict(row) for row in reversed(post_rows[:limit])])
+        return jsonify({
+            "posts": posts,
+            "newest_cursor": encode_cursor(posts[0]['created_at'], posts[0]['id']) if posts else request.args.get('after'),
+            "has_more_newer": has_more
+        })
+        
+    before_at, before_id = before or CURSOR_END
     post_rows = conn.execute(
-        'SELECT p.id, p.content, p.media_url, p.created_at, p.user_id, u.username FROM posts p '
-        'JOIN users u ON p.user_id = u.id '
-        'WHERE p.exam_group = ? AND p.channel = ? AND p.parent_post_id IS NULL '
-        'ORDER BY p.created_at DESC',
-        (exam_group, channel)
+        """
+        SELECT p.id, p.content, p.media_url, p.created_at, p.user_id, p.reply_count, u.username
+        FROM posts p
+        JOIN users u ON p.user_id = u.id
+        WHERE p.exam_group = ? AND p.channel = ? AND p.parent_post_id IS NULL
+          AND p.created_at <= ? AND (p.created_at < ? OR p.id < ?)
+        ORDER BY p.created_at DESC, p.id DESC
+        LIMIT ?
+        """,
+        (exam_group, channel, before_at, before_at, before_id, limit + 1)
     ).fetchall()
-    conn.close()
     
-    posts = []
-    for row in post_rows:
-        post = dict(row)
-        post['created_at'] = str(datetime.strptime(post['created_at'], '%Y-%m-%d %H:%M:%S'))
-        posts.append(post)
+    posts = attach_reply_previews(conn, [dict(row) for row in post_rows[:limit]])
+    next_cursor = None
+    if len(post_rows) > limit:
+        next_cursor = encode_cursor(posts[-1]['created_at'], posts[-1]['id'])
+    newest_cursor = None
+    if posts and not before:
+        newest_cursor = encode_cursor(posts[0]['created_at'], posts[0]['id'])
         
-    return jsonify({"posts": posts})
+    return jsonify({"posts": posts, "next_cursor": next_cursor, "newest_cursor": newest_cursor})
 
 @app.route('/api/get_replies')
 @login_required
 def get_replies():
+    """
+    Replies to a post, oldest first, one page at a time.
+    Pass the returned next_cursor as ?after= to get the next page, or to poll for new replies.
+    """
     parent_id = request.args.get('post_id')
     if not parent_id:
         return jsonify({"error": "Post ID not specified."}), 400
+    try:
+        after = decode_cursor(request.args.get('after'))
+    except ValueError:
+        return jsonify({"error": "Invalid cursor."}), 400
+    limit = get_page_limit(REPLIES_PAGE_SIZE)
 
-    conn = get_db_connection()
+    after_at, after_id = after or CURSOR_START
+    conn = get_read_db()
     reply_rows = conn.execute(
-        'SELECT p.id, p.content, p.media_url, p.created_at, p.user_id, u.username FROM posts p '
-        'JOIN users u ON p.user_id = u.id '
-        'WHERE p.parent_post_id = ? '
-        'ORDER BY p.created_at ASC',
-        (parent_id,)
+        """
+        SELECT p.id, p.content, p.media_url, p.created_at, p.user_id, u.username
+        FROM posts p
+        JOIN users u ON p.user_id = u.id
+        WHERE p.parent_post_id = ?
+          AND p.created_at >= ? AND (p.created_at > ? OR p.id > ?)
+        ORDER BY p.created_at ASC, p.id ASC
+        LIMIT ?
+        """,
+        (parent_id, after_at, after_at, after_id, limit + 1)
     ).fetchall()
-    conn.close()
     
-    replies = []
-    for row in reply_rows:
-        reply = dict(row)
-        reply['created_at'] = str(datetime.strptime(reply['created_at'], '%Y-%m-%d %H:%M:%S'))
-        replies.append(reply)
+    replies = [dict(row) for row in reply_rows[:limit]]
+    next_cursor = request.args.get('after')
+    if replies:
+        next_cursor = encode_cursor(replies[-1]['created_at'], replies[-1]['id'])
         
-    return jsonify({"replies": replies})
+    return jsonify({"replies": replies, "next_cursor": next_cursor, "has_more": len(reply_rows) > limit})
+
+@app.route('/api/search_posts')
+@login_required
+def search_posts():
+    """
+    Full-text search over posts and replies in the user's exam group, best match first.
+      ?q=ohms law&channel=general&limit=20&offset=0
+    Each result has an HTML-safe 'snippet' with the matches wrapped in <mark>.
+    """
+    match_query = search_index.build_match_query(request.args.get('q'))
+    if match_query is None:
+        return jsonify({"error": "Search query not specified."}), 400
+    channel = request.args.get('channel') or None
+    exam_group = session.get('exam_group', 'Other')
+    limit = get_page_limit(FEED_PAGE_SIZE)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    
+    results, has_more = search_index.search_posts(get_read_db(), match_query, exam_group, channel, limit, offset)
+    return jsonify({
+        "results": results,
+        "next_offset": offset + limit if has_more else None
+    })
 
 @app.route('/api/delete_post', methods=['POST'])
 @login_required
@@ -832,23 +1056,35 @@ def delete_post():
     if not post_id:
         return jsonify({"status": "error", "message": "Missing Post ID."}), 400
 
-    conn = get_db_connection()
+    conn = get_db()
     try:
-        conn.execute('DELETE FROM posts WHERE parent_post_id = ?', (post_id,))
-        result = conn.execute(
-            'DELETE FROM posts WHERE id = ? AND user_id = ?',
+        # Check ownership first, so nobody can delete the replies under someone else's post
+        post = conn.execute(
+            'SELECT id, parent_post_id FROM posts WHERE id = ? AND user_id = ?',
             (post_id, user_id)
-        )
-        conn.commit()
-        conn.close()
-        
-        if result.rowcount == 0:
+        ).fetchone()
+        if post is None:
             return jsonify({"status": "error", "message": "Post not found or permission denied."}), 403
             
+        media_rows = conn.execute(
+            'SELECT media_url FROM posts WHERE (id = ? OR parent_post_id = ?) AND media_url IS NOT NULL',
+            (post_id, post_id)
+        ).fetchall()
+        media_store.release(conn, [row['media_url'] for row in media_rows])
+        
+        if post['parent_post_id'] is None:
+            conn.execute('DELETE FROM posts WHERE parent_post_id = ?', (post_id,))
+        else:
+            conn.execute(
+                'UPDATE posts SET reply_count = reply_count - 1 WHERE id = ? AND reply_count > 0',
+                (post['parent_post_id'],)
+            )
+        conn.execute('DELETE FROM posts WHERE id = ?', (post_id,))
+        conn.commit()
+            
         return jsonify({"status": "success", "message": "Post deleted."})
     except Exception as e:
         conn.rollback()
-        conn.close()
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/api/add_post', methods=['POST'])
@@ -868,56 +1104,91 @@ def add_post():
     if not channel:
            return jsonify({"status": "error", "message": "Channel not specified."}), 400
 
+    media = None
     if 'file' in request.files:
         file = request.files['file']
-        if file.filename != '' and file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            unique_filename = f"{user_id}_{int(datetime.now().timestamp())}_{filename}"
-            save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-            
+        if file and file.filename != '':
+            if not allowed_file(file.filename):
+                return jsonify({"status": "error", "message": "File type not allowed."}), 400
             try:
-                file.save(save_path)
-                media_url = f"/static/uploads/{unique_filename}"
+                # Stored by content hash, so a re-upload of the same file reuses the stored copy
+                media, error_message, status_code = media_store.save_upload(file)
             except Exception as e:
                 print(f"Error saving file: {e}")
                 return jsonify({"status": "error", "message": "Failed to save uploaded file."}), 500
-        elif file.filename != '':
-            return jsonify({"status": "error", "message": "File type not allowed."}), 400
+            if error_message:
+                return jsonify({"status": "error", "message": error_message}), status_code
+            media_url = media['url']
             
     try:
-        conn = get_db_connection()
+        conn = get_db()
         conn.execute(
             'INSERT INTO posts (user_id, exam_group, channel, content, media_url, parent_post_id) VALUES (?, ?, ?, ?, ?, ?)',
             (user_id, exam_group, channel, content, media_url, parent_post_id)
         )
+        if media:
+            media_store.add_reference(conn, media)
+        if parent_post_id:
+            conn.execute('UPDATE posts SET reply_count = reply_count + 1 WHERE id = ?', (parent_post_id,))
+            awarded = []
+        else:
+            awarded = badges.increment(conn, user_id, 'posts_created')
         conn.commit()
-        conn.close()
-
-        if not parent_post_id:
-            conn_check = get_db_connection()
-            post_count_row = conn_check.execute(
-                'SELECT COUNT(*) FROM posts WHERE user_id = ? AND parent_post_id IS NULL',
-                (user_id,)
-            ).fetchone()
-            post_count = post_count_row[0] if post_count_row else 0
-            conn_check.close()
-            
-            if post_count == 1:
-                award_badge(user_id, 'Community Poster')
+        flash_badges(awarded)
         
         return jsonify({"status": "success", "message": "Post added."})
     except Exception as e:
         conn.rollback()
-        conn.close()
+        if media:
+            # The file is already on disk; without a media_blobs row GC would never remove it
+            try:
+                media_store.discard_upload(conn, media)
+                conn.commit()
+            except sqlite3.Error as discard_error:
+                conn.rollback()
+                print(f"Could not record unused upload {media['sha256']}: {discard_error}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+# --- Media Routes ---
+
+@app.route('/media/<path:filename>')
+def media(filename):
+    """
+    Serves uploaded post media with Range requests (video seeking), a strong ETag
+    and Last-Modified (304 when unchanged). Content-addressed files are cached
+    as immutable for a year, since a changed file would get a new name.
+    """
+    blob = media_store.parse_blob_url(media_store.URL_PREFIX + filename)
+    max_age = MEDIA_CACHE_SECONDS if blob else LEGACY_MEDIA_CACHE_SECONDS
+    
+    if MEDIA_ACCEL == 'nginx':
+        if safe_join(UPLOAD_FOLDER, filename) is None:
+            abort(404)
+        response = Response()
+        response.headers['X-Accel-Redirect'] = MEDIA_ACCEL_LOCATION + filename
+        response.headers['Content-Type'] = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    else:
+        # For content-addressed files the sha256 is the ETag, so nothing has to be hashed here
+        response = send_from_directory(
+            UPLOAD_FOLDER, filename,
+            conditional=True,
+            etag=blob[0] if blob else True,
+            max_age=max_age
+        )
+        
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    if blob:
+        response.cache_control.immutable = True
+    return response
+
 # --- Profile Routes ---
 
 @app.route('/profile')
 @login_required
 def profile():
-    conn = get_db_connection()
+    conn = get_read_db()
     user_row = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
     
     badges_rows = conn.execute(
@@ -961,7 +1232,6 @@ def profile():
         
         interviews.append(interview)
     
-    conn.close() 
     
     if user_row is None:
         return redirect(url_for('logout'))
@@ -981,35 +1251,56 @@ def profile():
 @app.route('/api/get_profile_stats')
 @login_required
 def get_profile_stats():
+    """
+    Returns the stats for the requested filter at the top level (as before), plus
+    every window under 'windows' so switching the filter needs no further request.
+    Only the requested filter carries ai_feedback; the other windows are numbers only.
+    """
     filter_period = request.args.get('filter', 'all')
-    stats = calculate_profile_stats(session['user_id'], filter_period)
+    if filter_period not in PROFILE_WINDOWS:
+        filter_period = 'all'
+    windows = calculate_all_profile_stats(session['user_id'], filter_period)
+    stats = dict(windows[filter_period])
+    stats['windows'] = windows
     return jsonify(stats)
 
+@app.route('/api/get_profile_history')
+@login_required
+def get_profile_history():
+    """Next page of quiz history: ?filter=week&before=<history_next_cursor>&limit=20"""
+    filter_period = request.args.get('filter', 'all')
+    if filter_period not in PROFILE_WINDOWS:
+        filter_period = 'all'
+    try:
+        before = decode_cursor(request.args.get('before'))
+    except ValueError:
+        return jsonify({"error": "Invalid cursor."}), 400
+    limit = get_page_limit(PROFILE_HISTORY_PAGE_SIZE)
+    
+    history, next_cursor = fetch_progress_history(get_read_db(), session['user_id'], filter_period, before, limit)
+    return jsonify({"history": history, "next_cursor": next_cursor})
+
 @app.route('/change_stream', methods=['GET', 'POST'])
 @login_required
 def change_stream():
-    conn = get_db_connection()
     if request.method == 'POST':
+        conn = get_db()
         new_group = request.form.get('stream')
         if not new_group:
             flash("Please choose a valid stream.", "warning")
-            conn.close()
             return redirect(url_for('change_stream'))
         try:
             conn.execute('UPDATE users SET exam_group = ? WHERE id = ?', (new_group, session['user_id']))
             conn.commit()
-            conn.close()
             session['exam_group'] = new_group
             flash("Stream updated successfully!", "success")
             return redirect(url_for('profile'))
         except Exception as e:
             conn.rollback()
-            conn.close()
             flash(f"Could not update stream: {e}", "danger")
             return redirect(url_for('change_stream'))
     current_group = session.get('exam_group', 'Other')
     available_streams = list(PYQ_LINKS.keys())
-    conn.close()
     return render_template('change_stream.html', current_group=current_group, available_streams=available_streams)
 
 @app.route('/delete_account', methods=['GET', 'POST'])
@@ -1018,19 +1309,36 @@ def delete_account():
     if request.method == 'POST':
         user_id = session['user_id']
         try:
-            conn = get_db_connection()
+            conn = get_db()
+            # Their replies on other people's posts no longer count towards those threads
+            conn.execute(
+                """
+                UPDATE posts
+                SET reply_count = MAX(0, reply_count - (SELECT COUNT(*) FROM posts r WHERE r.parent_post_id = posts.id AND r.user_id = ?))
+                WHERE id IN (SELECT parent_post_id FROM posts WHERE user_id = ? AND parent_post_id IS NOT NULL)
+                """,
+                (user_id, user_id)
+            )
+            media_rows = conn.execute(
+                'SELECT media_url FROM posts WHERE user_id = ? AND media_url IS NOT NULL',
+                (user_id,)
+            ).fetchall()
+            media_store.release(conn, [row['media_url'] for row in media_rows])
             conn.execute('DELETE FROM posts WHERE user_id = ?', (user_id,))
             conn.execute('DELETE FROM schedule WHERE user_id = ?', (user_id,))
             conn.execute('DELETE FROM user_progress WHERE user_id = ?', (user_id,))
+            interview_sessions.delete_user(conn, user_id)
             conn.execute('DELETE FROM interviews WHERE user_id = ?', (user_id,)) # Added interviews table
             conn.execute('DELETE FROM user_badges WHERE user_id = ?', (user_id,)) # Added user_badges table
+            conn.execute('DELETE FROM coach_feedback WHERE user_id = ?', (user_id,))
+            rollups.delete_user(conn, user_id)
+            badges.delete_user(conn, user_id)
+            streaks.delete_user(conn, user_id)
             conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
             conn.commit()
-            conn.close()
         except Exception as e:
             try:
                 conn.rollback()
-                conn.close()
             except:
                 pass
             flash(f"Failed to delete account: {e}", "danger")
@@ -1055,28 +1363,36 @@ def handle_generate_flashcards():
     API endpoint to handle flashcard generation.
     Takes JSON, returns JSON.
     """
-    data = request.get_json()
+    params, error = parse_flashcards_request(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+
+    flashcard_data = ai_helper.generate_ai_flashcards(**params)
+
+    if isinstance(flashcard_data, dict) and "error" in flashcard_data:
+        return jsonify(flashcard_data), 500
+
+    return jsonify(flashcard_data)
+
+def parse_flashcards_request(data):
+    """Validates a flashcard request. Returns (params, error_message)."""
+    data = data or {}
     topic = data.get('topic')
     num_cards_str = data.get('num_cards', 5) # Default to 5
 
     if not topic:
-        return jsonify({"error": "A topic is required."}), 400
+        return None, "A topic is required."
 
     try:
         num_cards = int(num_cards_str)
         if not 1 <= num_cards <= 20: # Set a reasonable limit
-            return jsonify({"error": "Number of cards must be between 1 and 20."}), 400
+            return None, "Number of cards must be between 1 and 20."
     except ValueError:
-        return jsonify({"error": "Invalid number of cards."}), 400
+        return None, "Invalid number of cards."
     except TypeError:
-        return jsonify({"error": "Invalid number of cards."}), 400
-
-    flashcard_data = ai_helper.generate_ai_flashcards(topic, num_cards)
-
-    if isinstance(flashcard_data, dict) and "error" in flashcard_data:
-        return jsonify(flashcard_data), 500
+        return None, "Invalid number of cards."
 
-    return jsonify(flashcard_data)
+    return {"topic": topic, "num_cards": num_cards}, None
 
 @app.route('/revision_roulette')
 @login_required
@@ -1128,10 +1444,165 @@ def interview_bot():
 def api_interview_chat():
     """
     Handles a single turn in the interview chat.
-    Receives the chat history and returns the AI's next response.
+    Receives the candidate's new message ({"session_id", "message"}; no
+    session_id starts a new interview) and returns the AI's next response.
+    If the last reply failed or was cut off, sending the session_id without a
+    message asks again for the reply to the stored answer.
+    Clients that still send the whole {"history"} are served as before.
+    Only a bounded part of the history is sent to the AI (see interview_context.py).
+    """
+    data = request.get_json() or {}
+    if is_legacy_interview_request(data):
+        chat_history, welcome_message = prepare_interview_history(data.get('history', []))
+        if welcome_message:
+            return jsonify({"answer": welcome_message})
+        response = ai_helper.get_interview_response(interview_context.bound_history(chat_history))
+        if isinstance(response, dict) and "error" in response:
+            return jsonify({"error": response["error"]}), 500
+        return jsonify({"answer": response})
+
+    session_id, chat_history, welcome_message, error = record_interview_message(data)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    if welcome_message:
+        return jsonify({"answer": welcome_message, "session_id": session_id})
+            
+    response = ai_helper.get_interview_response(interview_context.bound_history(chat_history))
+    
+    if isinstance(response, dict) and "error" in response:
+        return jsonify({"error": response["error"], "session_id": session_id}), 500
+
+    conn = get_db()
+    interview_sessions.add_turn(conn, session_id, 'assistant', response)
+    conn.commit()
+    return jsonify({"answer": response, "session_id": session_id})
+
+@app.route('/api/interview_chat/stream', methods=['POST'])
+@login_required
+def api_interview_chat_stream():
+    """
+    Same as /api/interview_chat, but streams the interviewer's reply as Server-Sent Events.
+    The session id is sent in the X-Interview-Session-Id header.
+    """
+    data = request.get_json() or {}
+    if is_legacy_interview_request(data):
+        chat_history, welcome_message = prepare_interview_history(data.get('history', []))
+        if welcome_message:
+            return sse_response(iter([welcome_message]))
+        return sse_response(ai_helper.stream_interview_response(interview_context.bound_history(chat_history)))
+
+    session_id, chat_history, welcome_message, error = record_interview_message(data)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    if welcome_message:
+        response = sse_response(iter([welcome_message]))
+    else:
+        reply = ai_helper.stream_interview_response(interview_context.bound_history(chat_history))
+        response = sse_response(save_streamed_interview_reply(session_id, reply))
+    response.headers['X-Interview-Session-Id'] = str(session_id)
+    return response
+
+@app.route('/api/interview_session')
+@login_required
+def api_interview_session():
+    """Returns the user's unfinished interview and its messages (to resume after a refresh), or null."""
+    conn = get_read_db()
+    row = interview_sessions.get_active_session(conn, session['user_id'])
+    if row is None:
+        return jsonify({"session": None})
+    return jsonify({"session": {
+        "session_id": row['id'],
+        "created_at": row['created_at'],
+        "history": interview_sessions.get_turns(conn, row['id'])
+    }})
+
+def is_legacy_interview_request(data):
+    """Older clients send the whole chat history instead of a session id and a new message."""
+    return 'history' in data and 'session_id' not in data and 'message' not in data
+
+def record_interview_message(data):
+    """
+    Stores the candidate's new message in their interview session, starting a
+    new session (with its opening turn) if no session_id is given. Commits.
+    When the last stored turn is still the candidate's (its reply failed), a
+    request without a message, or with the same message, is a retry: nothing
+    is stored and the reply is generated again.
+    Returns (session_id, chat_history, welcome_message, error); error is a
+    (message, status code) pair.
+    """
+    user_id = session['user_id']
+    session_id = data.get('session_id')
+    message = (data.get('message') or '').strip()
+    if len(message) > interview_sessions.MAX_MESSAGE_CHARS:
+        return None, None, None, (f"Your answer is too long (max {interview_sessions.MAX_MESSAGE_CHARS} characters).", 400)
+
+    conn = get_db()
+    if session_id is None:
+        session_id = interview_sessions.create_session(conn, user_id, session.get('exam_group', 'Other'))
+        chat_history = []
+    else:
+        row = interview_sessions.get_session(conn, session_id, user_id)
+        if row is None:
+            return None, None, None, ("Interview session not found.", 404)
+        if row['status'] != 'active':
+            return None, None, None, ("This interview has already been evaluated.", 409)
+        chat_history = interview_sessions.get_turns(conn, session_id)
+        if chat_history and chat_history[-1]['role'] == 'user':
+            if message in ('', chat_history[-1]['content']):
+                return session_id, chat_history, None, None
+            return None, None, None, ("The interviewer has not replied to your last answer yet. Send the request again without a message to get the reply.", 409)
+        if not message:
+            return None, None, None, ("No message provided.", 400)
+
+    position = None
+    if message:
+        position = interview_sessions.add_turn(conn, session_id, 'user', message)
+        chat_history.append({"role": "user", "content": message})
+    chat_history, welcome_message = prepare_interview_history(chat_history)
+    if welcome_message:
+        interview_sessions.add_turn(conn, session_id, 'assistant', welcome_message)
+    elif len(chat_history) == 1 and not message:
+        interview_sessions.add_turn(conn, session_id, 'user', chat_history[0]['content']) # The opening "Start the interview."
+    conn.commit()
+
+    if position is not None and position > 2:
+        # Score the answer now, so the final evaluation only has to add things up
+        ai_jobs.submit('interview_answer_score', {"session_id": session_id, "position": position}, user_id=user_id)
+    return session_id, chat_history, welcome_message, None
+
+def save_streamed_interview_reply(session_id, chunks):
+    """
+    Passes the interviewer's streamed reply through and stores it once the
+    stream ends. If the client disconnects, the part that was sent is stored;
+    a reply that failed is not stored, so the client can ask for it again.
+    """
+    parts = []
+    failed = False
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, dict):
+                failed = True
+                yield chunk
+                return
+            parts.append(chunk)
+            yield chunk
+    finally:
+        chunks.close()
+        answer = "".join(parts).strip()
+        if answer and not failed:
+            conn = db.connect() # The request's connection is gone by the time the stream ends
+            try:
+                interview_sessions.add_turn(conn, session_id, 'assistant', answer)
+                conn.commit()
+            finally:
+                conn.close()
+
+def prepare_interview_history(chat_history):
+    """
+    Fills in the opening turn for a new interview based on the user's stream.
+    Returns (chat_history, welcome_message); the welcome message is sent
+    as-is, without calling the AI.
     """
-    data = request.get_json()
-    chat_history = data.get('history', [])
     user_stream = session.get('exam_group', 'Other') # Get user's stream
 
     if not chat_history:
@@ -1139,52 +1610,133 @@ def api_interview_chat():
             chat_history = [{"role": "user", "content": "Start the interview."}]
         elif user_stream == 'Other':
             welcome_message = "Welcome. I see you're in the 'Other' stream. What specific interview are you preparing for today? (e.g., 'Google SWE', 'Medical School', 'Bank PO')"
-            return jsonify({"answer": welcome_message})
-            
-    response = ai_helper.get_interview_response(chat_history)
-    
-    if isinstance(response, dict) and "error" in response:
-        return jsonify({"error": response["error"]}), 500
-        
-    return jsonify({"answer": response})
+            return chat_history, welcome_message
+    return chat_history, None
 
 @app.route('/api/interview_evaluate', methods=['POST'])
 @login_required
 def api_interview_evaluate():
     """
-    Receives the final transcript, gets an evaluation,
-    and saves everything to the database.
+    Evaluates an interview (its stored session, or the transcript sent by an
+    older client) and saves everything to the database.
     """
-    data = request.get_json()
-    chat_history = data.get('history', [])
+    params, error = parse_interview_evaluation_request(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+
+    evaluation_data = evaluate_and_save_interview(session['user_id'], **params)
+    
+    if isinstance(evaluation_data, dict) and "error" in evaluation_data:
+        return jsonify({"error": evaluation_data["error"]}), 500
+
+    # 4. Return the evaluation to the user
+    return jsonify(evaluation_data)
+
+def parse_interview_evaluation_request(data):
+    """
+    Validates an interview evaluation request and builds the plain text
+    transcript, from the stored turns of {"session_id"} or from an older
+    client's {"history"}.
+    """
+    data = data or {}
+    session_id = data.get('session_id')
+    if session_id is not None:
+        conn = get_read_db()
+        row = interview_sessions.get_session(conn, session_id, session['user_id'])
+        if row is None:
+            return None, "Interview session not found."
+        if row['status'] != 'active':
+            return None, "This interview has already been evaluated."
+        chat_history = interview_sessions.get_turns(conn, session_id)
+    else:
+        chat_history = data.get('history', [])
     
     if len(chat_history) < 3: # Need more than start, question, and answer
-        return jsonify({"error": "Interview is too short to evaluate."}), 400
+        return None, "Interview is too short to evaluate."
 
     # 1. Create a plain text transcript
-    transcript_text = ""
-    for message in chat_history:
-        if message['role'] == 'user':
-            transcript_text += f"Candidate: {message['content']}\n\n"
-        elif message['role'] == 'assistant':
-            transcript_text += f"Interviewer: {message['content']}\n\n"
+    params = {"transcript_text": interview_sessions.build_transcript(chat_history)}
+    if session_id is not None:
+        params["session_id"] = session_id
+    return params, None
+
+def score_interview_answer(session_id, position):
+    """Job handler: scores one stored interview answer, unless it has a score already."""
+    conn = get_db() # Runs on a job worker thread, so this is that thread's own connection
+    try:
+        answers = interview_sessions.get_unscored_answers(conn, session_id, position)
+        if not answers:
+            return {"status": "skipped"}
+        scores = ai_helper.score_interview_answer(answers[0]['question'], answers[0]['answer'])
+        if "error" in scores:
+            return scores
+        interview_sessions.save_answer_score(conn, session_id, position, scores)
+        conn.commit()
+        return scores
+    except Exception:
+        conn.rollback()
+        raise
 
+def evaluate_interview_session(session_id):
+    """
+    Builds an evaluation from the per-answer scores: answers whose background
+    scoring has not finished are scored now, the scores are averaged, and one
+    small call turns the notes into feedback and strengths (if that call fails,
+    the notes are used directly). Returns None if the answers can't be scored,
+    so the caller can fall back to evaluating the whole transcript.
+    """
+    conn = get_db()
+    # Score first, then write: no write lock is held while waiting on the AI
+    new_scores = []
+    for answer in interview_sessions.get_unscored_answers(conn, session_id):
+        scores = ai_helper.score_interview_answer(answer['question'], answer['answer'])
+        if "error" in scores:
+            print(f"Scoring answer {answer['position']} of interview {session_id} failed: {scores['error']}")
+            return None
+        new_scores.append((answer['position'], scores))
+    try:
+        for position, scores in new_scores:
+            interview_sessions.save_answer_score(conn, session_id, position, scores)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Database error while scoring interview {session_id}: {e}")
+        return None
+
+    scored_answers = interview_sessions.get_answer_scores(conn, session_id)
+    if not scored_answers:
+        return None
+    synthesis = ai_helper.synthesize_interview_feedback(scored_answers)
+    if "error" in synthesis:
+        print(f"Interview {session_id} synthesis failed, using the answer notes: {synthesis['error']}")
+        synthesis = interview_sessions.notes_as_feedback(scored_answers)
+    return {"topic": "Interview", **synthesis, **interview_sessions.aggregate_scores(scored_answers)}
+
+def evaluate_and_save_interview(user_id, transcript_text, session_id=None):
+    """
+    Gets an AI evaluation of a transcript and saves it to the interviews table
+    (closing the interview session, if there is one). Sessions are evaluated
+    from their per-answer scores; the whole transcript is only sent to the AI
+    for older clients or if that fails.
+    """
     # 2. Get evaluation from AI
-    evaluation_data = ai_helper.get_interview_evaluation(transcript_text)
+    evaluation_data = evaluate_interview_session(session_id) if session_id is not None else None
+    if evaluation_data is None:
+        evaluation_data = ai_helper.get_interview_evaluation(transcript_text)
     
     if isinstance(evaluation_data, dict) and "error" in evaluation_data:
-        return jsonify({"error": evaluation_data["error"]}), 500
+        return evaluation_data
 
     # 3. Save to database
+    conn = get_db()
     try:
-        conn = get_db_connection()
-        conn.execute(
+        cursor = conn.execute(
             """
             INSERT INTO interviews (user_id, transcript, score_confidence, score_clarity, feedback, strengths)
             VALUES (?, ?, ?, ?, ?, ?)
             """,
             (
-                session['user_id'],
+                user_id,
                 transcript_text,
                 evaluation_data.get('score_confidence'),
                 evaluation_data.get('score_clarity'),
@@ -1192,14 +1744,17 @@ def api_interview_evaluate():
                 json.dumps(evaluation_data.get('strengths', [])) # Store lists as JSON strings
             )
         )
+        if session_id is not None and not interview_sessions.mark_evaluated(conn, session_id, cursor.lastrowid):
+            # Another request (a double click, or a queued evaluation job) got there first
+            conn.rollback()
+            return {"error": "This interview has already been evaluated."}
         conn.commit()
-        conn.close()
     except Exception as e:
+        conn.rollback()
         print(f"Database save error: {e}")
-        return jsonify({"error": "Failed to save interview results."}), 500
+        return {"error": "Failed to save interview results."}
 
-    # 4. Return the evaluation to the user
-    return jsonify(evaluation_data)
+    return evaluation_data
 
 # --- *** VISUALIZER ROUTE (SIMPLIFIED) *** ---
 @app.route('/visualizer')
@@ -1215,13 +1770,12 @@ def api_generate_diagram():
     Takes a topic, asks the AI for Mermaid.js code,
     and returns that code to the frontend.
     """
-    data = request.get_json()
-    topic = data.get('topic')
-    if not topic:
-        return jsonify({"error": "A topic is required."}), 400
+    params, error = parse_diagram_request(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
 
     # Call the diagram function (no more routing)
-    diagram_data = ai_helper.generate_ai_diagram(topic)
+    diagram_data = ai_helper.generate_ai_diagram(params['topic'])
 
     if isinstance(diagram_data, dict) and "error" in diagram_data:
         return jsonify(diagram_data), 500
@@ -1229,6 +1783,83 @@ def api_generate_diagram():
     # Success! Return the JSON with the Mermaid code
     return jsonify(diagram_data) # This will be {"mermaid_code": "..."}
 
+def parse_diagram_request(data):
+    """Validates a diagram request. Returns (params, error_message)."""
+    topic = (data or {}).get('topic')
+    if not topic:
+        return None, "A topic is required."
+    return {"topic": topic}, None
+
+@app.route('/api/ai_stats')
+@login_required
+def api_ai_stats():
+    """Returns AI response cache, request coalescing, output parsing, token usage and background job counters."""
+    return jsonify({
+        "cache": ai_cache.get_stats(),
+        "coalescing": ai_singleflight.get_stats(),
+        "parsing": ai_schemas.get_stats(),
+        "usage": ai_usage.get_stats(),
+        "quiz_pool": quiz_pool.get_stats(),
+        "catalog": catalog.get_stats(),
+        "jobs": ai_jobs.get_stats()
+    })
+
+# --- *** BACKGROUND AI JOB ROUTES *** ---
+# Slow generations can be queued instead of holding a web worker for the whole
+# Groq call. The client submits a job, gets its id at once, then polls for the result.
+
+def run_notes_job(topic_text):
+    """Job handler for notes (generate_ai_notes returns plain text or an error dict)."""
+    notes = ai_helper.generate_ai_notes(topic_text)
+    if isinstance(notes, dict) and "error" in notes:
+        return notes
+    return {"notes": notes}
+
+ai_jobs.register('quiz', lambda **params: get_ai_quiz(params))
+ai_jobs.register('flashcards', ai_helper.generate_ai_flashcards)
+ai_jobs.register('diagram', ai_helper.generate_ai_diagram)
+ai_jobs.register('notes', run_notes_job)
+ai_jobs.register('interview_evaluation', evaluate_and_save_interview)
+ai_jobs.register('interview_answer_score', score_interview_answer)
+
+# Each job type accepts the same JSON body as its synchronous endpoint.
+JOB_REQUEST_PARSERS = {
+    'quiz': parse_quiz_request,
+    'flashcards': parse_flashcards_request,
+    'diagram': parse_diagram_request,
+    'notes': parse_notes_request,
+    'interview_evaluation': parse_interview_evaluation_request
+}
+
+@app.route('/api/submit_job/<job_type>', methods=['POST'])
+@login_required
+def api_submit_job(job_type):
+    """Queues an AI generation and returns its job id immediately."""
+    parser = JOB_REQUEST_PARSERS.get(job_type)
+    if parser is None:
+        return jsonify({"error": "Unknown job type."}), 404
+
+    params, error = parser(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+    if job_type == 'interview_evaluation':
+        params['user_id'] = session['user_id']
+
+    job_id = ai_jobs.submit(job_type, params, user_id=session['user_id'])
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+@app.route('/api/job_status/<job_id>')
+@login_required
+def api_job_status(job_id):
+    """Returns a job's status, plus its result or error once it has finished."""
+    job = ai_jobs.get_job(job_id, user_id=session['user_id'])
+    if job is None:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify(job)
+
+ai_jobs.start_workers()
+quiz_pool.start_refiller()
+
 # --- *** AI STUDY ENVIRONMENT ROUTES *** ---
 @app.route('/environment')
 @login_required
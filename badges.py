@@ -0,0 +1,142 @@
+import sys
+import catalog
+
+# --- Badge Rules Engine ---
+# Badges are declared as data: a badge is earned once the user's counter
+# reaches the threshold. Counters live in user_counters and are bumped in the
+# same transaction as the write that caused them (a saved quiz, a new post...),
+# and the badge is inserted with INSERT OR IGNORE on user_badges(user_id, badge_id),
+# so there are no COUNT(*) scans and no duplicate awards. Badge ids come from
+# the in-memory catalog (catalog.py) rather than a lookup by name.
+#
+# To add a badge, append a rule and run `python badges.py backfill` so users
+# who already qualify get it too.
+
+BADGE_RULES = [
+    {"badge": "First Steps", "description": "Registered for an account", "icon": "play-circle",
+     "counter": "registered", "threshold": 1},
+    {"badge": "Quiz Taker", "description": "Completed your first quiz", "icon": "check-circle",
+     "counter": "quizzes_completed", "threshold": 1},
+    {"badge": "Quiz Master", "description": "Completed 10 quizzes", "icon": "award",
+     "counter": "quizzes_completed", "threshold": 10},
+    {"badge": "Community Poster", "description": "Made your first post in the community", "icon": "message-square",
+     "counter": "posts_created", "threshold": 1},
+    {"badge": "Streak Starter", "description": "Achieved a 3-day study streak", "icon": "flame",
+     "counter": "best_streak", "threshold": 3},
+]
+
+# How each counter is recomputed from existing data by backfill()
+COUNTER_SOURCES = {
+    "registered": "SELECT id AS user_id, 1 AS value FROM users",
+    "quizzes_completed": "SELECT user_id, COUNT(*) AS value FROM user_progress GROUP BY user_id",
+    "posts_created": "SELECT user_id, COUNT(*) AS value FROM posts WHERE parent_post_id IS NULL GROUP BY user_id",
+    "best_streak": "SELECT id AS user_id, current_streak AS value FROM users WHERE current_streak > 0",
+}
+
+
+def _award_for_counter(conn, user_id, counter, value):
+    """Awards every badge whose rule on this counter is now met. Returns the newly earned rules."""
+    awarded = []
+    for rule in BADGE_RULES:
+        if rule["counter"] != counter or value < rule["threshold"]:
+            continue
+        badge = catalog.get_badge(rule["badge"])
+        if badge is None:
+            print(f"Badge '{rule['badge']}' is not defined; run `python badges.py backfill`.")
+            continue
+        result = conn.execute(
+            'INSERT OR IGNORE INTO user_badges (user_id, badge_id) VALUES (?, ?)',
+            (user_id, badge['id'])
+        )
+        if result.rowcount == 1:
+            awarded.append(rule)
+    return awarded
+
+
+def increment(conn, user_id, counter, amount=1):
+    """
+    Adds amount to one of the user's counters and awards any badge it unlocks.
+    Returns the newly earned badge rules (usually none). Does not commit.
+    """
+    value = conn.execute(
+        """
+        INSERT INTO user_counters (user_id, counter, value) VALUES (?, ?, ?)
+        ON CONFLICT (user_id, counter) DO UPDATE SET value = value + excluded.value
+        RETURNING value
+        """,
+        (user_id, counter, amount)
+    ).fetchone()[0]
+    return _award_for_counter(conn, user_id, counter, value)
+
+
+def record_max(conn, user_id, counter, value):
+    """
+    For high-water-mark counters (e.g. best_streak): keeps the larger of the
+    stored value and this one, then awards like increment(). Does not commit.
+    """
+    value = conn.execute(
+        """
+        INSERT INTO user_counters (user_id, counter, value) VALUES (?, ?, ?)
+        ON CONFLICT (user_id, counter) DO UPDATE SET value = MAX(value, excluded.value)
+        RETURNING value
+        """,
+        (user_id, counter, value)
+    ).fetchone()[0]
+    return _award_for_counter(conn, user_id, counter, value)
+
+
+def delete_user(conn, user_id):
+    """Removes a user's counters (account deletion). Does not commit."""
+    conn.execute('DELETE FROM user_counters WHERE user_id = ?', (user_id,))
+
+
+def sync_badge_definitions(conn):
+    """Makes sure every badge in BADGE_RULES exists in the badges table. Does not commit."""
+    conn.executemany(
+        'INSERT OR IGNORE INTO badges (name, description, icon) VALUES (?, ?, ?)',
+        [(rule["badge"], rule["description"], rule["icon"]) for rule in BADGE_RULES]
+    )
+
+
+def backfill(conn):
+    """
+    Recomputes every counter from the existing data (keeping the larger value
+    for high-water marks like best_streak) and awards all badges users already
+    qualify for, in a handful of set-based statements. Does not commit.
+    """
+    sync_badge_definitions(conn)
+    for counter, source_sql in COUNTER_SOURCES.items():
+        conn.execute(
+            f"""
+            INSERT INTO user_counters (user_id, counter, value)
+            SELECT source.user_id, ?, source.value FROM ({source_sql}) AS source
+            WHERE true
+            ON CONFLICT (user_id, counter) DO UPDATE SET value = MAX(value, excluded.value)
+            """,
+            (counter,)
+        )
+    for rule in BADGE_RULES:
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO user_badges (user_id, badge_id)
+            SELECT c.user_id, b.id
+            FROM user_counters c
+            JOIN badges b ON b.name = ?
+            WHERE c.counter = ? AND c.value >= ?
+            """,
+            (rule["badge"], rule["counter"], rule["threshold"])
+        )
+
+
+if __name__ == '__main__':
+    # Usage: python badges.py backfill
+    import db
+    if sys.argv[1:] != ['backfill']:
+        sys.exit("Usage: python badges.py backfill")
+    conn = db.connect()
+    try:
+        backfill(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    print("Badge counters recomputed and missing badges awarded.")
@@ -0,0 +1,95 @@
+import threading
+import time
+import db
+
+# --- Catalog Cache ---
+# Quizzes, their questions and answer keys, and badge definitions rarely
+# change, so each process keeps them in memory. Triggers on those tables bump
+# catalog_version.version on every write; the cache compares it with the
+# version it loaded (at most once every CATALOG_RECHECK_SECONDS) and reloads
+# when it moved, so a change made by any process is picked up everywhere.
+# Between rechecks, reads don't touch the database at all.
+
+CATALOG_RECHECK_SECONDS = 5
+
+_lock = threading.Lock()
+_catalog = None         # The loaded data, see _reload()
+_checked_at = 0.0
+
+
+def _reload(conn, version):
+    """Reads every catalog table into plain dicts."""
+    quizzes = [dict(row) for row in conn.execute('SELECT * FROM quizzes ORDER BY id')]
+    questions = {}
+    for row in conn.execute('SELECT * FROM questions ORDER BY quiz_id, id'):
+        questions.setdefault(row['quiz_id'], []).append(dict(row))
+    badge_rows = [dict(row) for row in conn.execute('SELECT * FROM badges')]
+    return {
+        "version": version,
+        "quizzes": quizzes,
+        "quizzes_by_id": {quiz['id']: quiz for quiz in quizzes},
+        "questions": questions,
+        "answer_keys": {
+            quiz_id: {question['id']: question['correct_answer'] for question in quiz_questions}
+            for quiz_id, quiz_questions in questions.items()
+        },
+        "badges_by_name": {badge['name']: badge for badge in badge_rows},
+    }
+
+
+def _get_catalog():
+    """Returns the current catalog, rechecking the version if the last check is old enough."""
+    global _catalog, _checked_at
+    if _catalog is not None and time.monotonic() - _checked_at < CATALOG_RECHECK_SECONDS:
+        return _catalog
+
+    with _lock:
+        if _catalog is not None and time.monotonic() - _checked_at < CATALOG_RECHECK_SECONDS:
+            return _catalog # Another thread just refreshed it
+        conn = db.connect(read_only=True)
+        try:
+            version = conn.execute('SELECT version FROM catalog_version WHERE id = 1').fetchone()['version']
+            if _catalog is None or _catalog['version'] != version:
+                _catalog = _reload(conn, version)
+        finally:
+            conn.close()
+        _checked_at = time.monotonic()
+    return _catalog
+
+
+def get_quizzes():
+    """All static quizzes, by id."""
+    return _get_catalog()['quizzes']
+
+
+def get_quiz(quiz_id):
+    """One quiz as a dict, or None."""
+    return _get_catalog()['quizzes_by_id'].get(quiz_id)
+
+
+def get_questions(quiz_id):
+    """The quiz's questions in order (an empty list if it has none)."""
+    return _get_catalog()['questions'].get(quiz_id, [])
+
+
+def get_answer_key(quiz_id):
+    """{question_id: correct_answer} for the quiz."""
+    return _get_catalog()['answer_keys'].get(quiz_id, {})
+
+
+def get_badge(name):
+    """A badge definition (id, name, description, icon) by name, or None."""
+    return _get_catalog()['badges_by_name'].get(name)
+
+
+def get_stats():
+    """Which catalog version this process has loaded, and how much of it."""
+    catalog = _catalog
+    if catalog is None:
+        return {"version": None}
+    return {
+        "version": catalog['version'],
+        "quizzes": len(catalog['quizzes']),
+        "questions": sum(len(questions) for questions in catalog['questions'].values()),
+        "badges": len(catalog['badges_by_name']),
+    }
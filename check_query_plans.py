@@ -0,0 +1,138 @@
+import ast
+import sqlite3
+import sys
+import migrations
+
+# Runs EXPLAIN QUERY PLAN on every SQL statement in these files and fails
+# (exit code 1) if any of them falls back to a full table scan. SQL built at
+# runtime is planned with a ? in place of each f-string value; if that does not
+# plan, or the SQL is not a string at all, it is listed as unchecked.
+SOURCE_FILES = ['app.py', 'rollups.py', 'search_index.py', 'media_store.py', 'badges.py', 'streaks.py', 'catalog.py', 'interview_sessions.py']
+
+# Tables that are meant to be read in full (small reference data).
+ALLOWED_FULL_SCANS = {
+    'quizzes',  # /quizzes lists every quiz
+}
+
+SKIPPED_PREFIXES = ('PRAGMA', 'BEGIN', 'COMMIT', 'ROLLBACK', 'CREATE', 'DROP', 'ANALYZE')
+
+# Maintenance commands that recompute derived data from whole tables on purpose,
+# and the catalog cache loading its reference tables.
+SKIPPED_FUNCTIONS = {'rebuild', 'backfill', '_reload'}
+
+
+def render_fstring(node):
+    """An f-string's SQL with ? in place of every interpolated value."""
+    return ''.join(value.value if isinstance(value, ast.Constant) else '?' for value in node.values)
+
+
+def find_sql_statements(path):
+    """
+    Yields (line number, SQL, exact) for every execute()/executemany() call. SQL is
+    a string literal or a variable assigned one in the same function (exact), an
+    f-string rendered by render_fstring (not exact), or None if it can't be read.
+    """
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    for func in ast.walk(tree):
+        if not isinstance(func, ast.FunctionDef) or func.name in SKIPPED_FUNCTIONS:
+            continue
+        literals = {}
+        for node in ast.walk(func):
+            if not isinstance(node, ast.Assign):
+                continue
+            if isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+                sql = (node.value.value, True)
+            elif isinstance(node.value, ast.JoinedStr):
+                sql = (render_fstring(node.value), False)
+            else:
+                continue
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    literals[target.id] = sql
+        for node in ast.walk(func):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)):
+                continue
+            if node.func.attr not in ('execute', 'executemany') or not node.args:
+                continue
+            arg = node.args[0]
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                yield node.lineno, arg.value, True
+            elif isinstance(arg, ast.JoinedStr):
+                yield node.lineno, render_fstring(arg), False
+            elif isinstance(arg, ast.Name) and arg.id in literals:
+                yield node.lineno, *literals[arg.id]
+            else:
+                yield node.lineno, None, False
+
+
+def build_test_database():
+    """
+    Builds an empty in-memory database from the migrations (no data, no
+    statistics), so plans reflect how SQLite treats a large database.
+    """
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    migrations.migrate(conn)
+    return conn
+
+
+def check_statement(conn, sql):
+    """Returns a list of problems with one statement's query plan (empty if it is fine)."""
+    params = [None] * sql.count('?')
+    try:
+        plan = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    except sqlite3.Error as e:
+        return [f"could not be planned: {e}"]
+
+    problems = []
+    for row in plan:
+        detail = row[3]
+        if not detail.startswith('SCAN '):
+            continue
+        if 'VIRTUAL TABLE' in detail or detail == 'SCAN CONSTANT ROW':
+            continue
+        if detail.startswith('SCAN (subquery-'):
+            continue # Reads a subquery's own (already searched) rows, not a table
+        table = detail.split()[1]
+        if table in ALLOWED_FULL_SCANS:
+            continue
+        problems.append(detail)
+    return problems
+
+
+def main():
+    conn = build_test_database()
+    failures = 0
+    checked = 0
+    unchecked = 0
+    try:
+        for source in SOURCE_FILES:
+            for lineno, sql, exact in find_sql_statements(source):
+                if sql is None:
+                    unchecked += 1
+                    print(f"UNCHECKED {source}:{lineno}: SQL is not a string literal or f-string")
+                    continue
+                statement = " ".join(sql.split())
+                if statement.upper().startswith(SKIPPED_PREFIXES):
+                    continue
+                problems = check_statement(conn, statement)
+                if not exact and any(problem.startswith("could not be planned") for problem in problems):
+                    unchecked += 1
+                    print(f"UNCHECKED {source}:{lineno}: {statement}")
+                    continue
+                checked += 1
+                if problems:
+                    failures += 1
+                    print(f"FAIL {source}:{lineno}: {statement}")
+                    for problem in problems:
+                        print(f"     -> {problem}")
+    finally:
+        conn.close()
+
+    print(f"Checked {checked} statements, {failures} with full table scans, {unchecked} unchecked.")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+from flask import g, has_app_context
+
+# --- Database Configuration ---
+DATABASE = 'database.db'
+BUSY_TIMEOUT_MS = 5000          # Wait for a competing writer instead of failing with "database is locked"
+CACHE_SIZE_KIB = 16 * 1024      # Page cache per connection
+MMAP_SIZE = 128 * 1024 * 1024   # Memory-map reads up to this many bytes of the file
+
+_wal_enabled = False
+_thread_local = threading.local()
+
+
+def _configure(conn, read_only=False):
+    """Applies the connection settings every app connection should have."""
+    global _wal_enabled
+    conn.row_factory = sqlite3.Row
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    if not _wal_enabled and not read_only:
+        # WAL is stored in the database file, so this only has to happen once per process.
+        # A read-only connection cannot change the journal mode; the first writer does it.
+        conn.execute('PRAGMA journal_mode = WAL')
+        _wal_enabled = True
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KIB}')
+    conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+    conn.execute('PRAGMA foreign_keys = ON')
+    return conn
+
+
+def connect(read_only=False):
+    """
+    Opens a new, fully configured connection. The caller owns it and must close it.
+    Most code should use get_db()/get_read_db() instead.
+    """
+    if read_only:
+        conn = sqlite3.connect(f'file:{DATABASE}?mode=ro', uri=True, timeout=BUSY_TIMEOUT_MS / 1000)
+    else:
+        conn = sqlite3.connect(DATABASE, timeout=BUSY_TIMEOUT_MS / 1000)
+    return _configure(conn, read_only)
+
+
+def _get_shared(name, read_only):
+    """Reuses one connection per request (flask.g) or, outside a request, per thread."""
+    holder = g if has_app_context() else _thread_local
+    conn = getattr(holder, name, None)
+    if conn is None:
+        conn = connect(read_only)
+        setattr(holder, name, conn)
+    return conn
+
+
+def get_db():
+    """Returns the read-write connection for the current request or thread."""
+    return _get_shared('_db_conn', read_only=False)
+
+
+def get_read_db():
+    """Returns a read-only connection for the current request or thread (for GET routes)."""
+    return _get_shared('_db_read_conn', read_only=True)
+
+
+def close_db(exception=None):
+    """Teardown handler: closes the request's connections, rolling back anything uncommitted."""
+    for name in ('_db_conn', '_db_read_conn'):
+        conn = g.pop(name, None)
+        if conn is not None:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.close()
+
+
+def init_app(app):
+    """Registers the teardown handler with the Flask app."""
+    app.teardown_appcontext(close_db)
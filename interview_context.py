@@ -0,0 +1,101 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import ai_cache
+import ai_helper
+
+# --- Interview Context Management ---
+# An interview's prompt must not grow with its length. The last few messages
+# are sent verbatim; everything before them is folded into a rolling summary.
+# Summaries are made at every INTERVIEW_SUMMARY_STEP messages and stored in the
+# AI response cache under a digest of the messages they cover, so the next
+# turn (from any process) finds them. A turn never waits for a summary: it
+# uses the newest one available and queues the missing one in the background.
+# Whatever is sent is finally cut to INTERVIEW_PROMPT_TOKENS.
+INTERVIEW_RECENT_MESSAGES = 8
+INTERVIEW_SUMMARY_STEP = 4
+INTERVIEW_PROMPT_TOKENS = 2500
+INTERVIEW_SUMMARY_TTL = 24 * 3600
+
+summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="interview-summary")
+_summarizing = set()
+_summarizing_lock = threading.Lock()
+
+
+def _summary_key(messages):
+    """Cache key for the summary of exactly these messages."""
+    payload = json.dumps([[m.get('role'), m.get('content')] for m in messages], ensure_ascii=False)
+    return "interview_summary:" + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _find_summary(history, upto):
+    """Returns (covered, summary) for the longest summarized prefix of at most `upto` messages."""
+    covered = upto - upto % INTERVIEW_SUMMARY_STEP
+    while covered > 0:
+        summary = ai_cache.get(_summary_key(history[:covered]))
+        if summary is not None:
+            return covered, summary
+        covered -= INTERVIEW_SUMMARY_STEP
+    return 0, ""
+
+
+def _refresh_summary(history, boundary):
+    """Background job: folds the messages up to boundary into the newest summary before it."""
+    key = _summary_key(history[:boundary])
+    try:
+        covered, summary = _find_summary(history, boundary)
+        if covered == boundary:
+            return
+        new_summary = ai_helper.summarize_interview(summary, history[covered:boundary])
+        if isinstance(new_summary, dict):
+            print(f"Interview summary failed: {new_summary['error']}")
+            return
+        ai_cache.put(key, new_summary, INTERVIEW_SUMMARY_TTL)
+    finally:
+        with _summarizing_lock:
+            _summarizing.discard(key)
+
+
+def _schedule_summary(history, boundary):
+    key = _summary_key(history[:boundary])
+    with _summarizing_lock:
+        if key in _summarizing:
+            return
+        _summarizing.add(key)
+    summary_executor.submit(_refresh_summary, list(history[:boundary]), boundary)
+
+
+def bound_history(chat_history):
+    """
+    Returns the messages to send for the next interview turn: a summary of the
+    older messages (as a system message) plus the recent ones, within
+    INTERVIEW_PROMPT_TOKENS together with the interviewer's system prompt.
+    """
+    history = [m for m in chat_history if isinstance(m, dict) and m.get('role') in ('user', 'assistant')]
+    older_count = max(len(history) - INTERVIEW_RECENT_MESSAGES, 0)
+    boundary = older_count - older_count % INTERVIEW_SUMMARY_STEP
+
+    covered, summary = _find_summary(history, boundary)
+    if covered < boundary:
+        _schedule_summary(history, boundary)
+
+    budget = INTERVIEW_PROMPT_TOKENS - ai_helper.estimate_tokens(ai_helper.INTERVIEW_SYSTEM_PROMPT)
+    prefix = []
+    if summary:
+        summary_message = {"role": "system", "content": f"Summary of the interview so far:\n{summary}"}
+        prefix = [summary_message]
+        budget -= ai_helper.estimate_tokens(summary_message['content'])
+
+    # Newest messages first, until the budget runs out (the last one is always kept)
+    recent = []
+    for message in reversed(history[covered:]):
+        tokens = ai_helper.estimate_tokens(message.get('content') or '')
+        if recent and tokens > budget:
+            break
+        if tokens > budget:
+            message = {"role": message['role'], "content": (message.get('content') or '')[:max(budget, 0) * 4]}
+            tokens = budget
+        recent.append({"role": message['role'], "content": message.get('content') or ''})
+        budget -= tokens
+    return prefix + list(reversed(recent))
@@ -0,0 +1,177 @@
+# --- Interview Sessions ---
+# Mock interviews are stored server-side: one interview_sessions row per
+# interview and one interview_turns row per message, numbered by position.
+# The browser only sends its new message; the AI context (interview_context.py)
+# and the final evaluation are built from the stored turns, and an interview
+# in progress survives a page refresh.
+#
+# Each answer is scored in the background right after it is stored
+# (interview_turn_scores), so evaluating an interview only has to aggregate
+# the scores. An answer is scorable when it follows an AI-written question,
+# i.e. an assistant turn after position 1 (position 1 is either the opening
+# "Start the interview." or the fixed welcome message).
+
+MAX_MESSAGE_CHARS = 4000
+
+
+def create_session(conn, user_id, exam_group):
+    """Starts a new interview for the user and returns its id. Does not commit."""
+    return conn.execute(
+        'INSERT INTO interview_sessions (user_id, exam_group) VALUES (?, ?) RETURNING id',
+        (user_id, exam_group)
+    ).fetchone()['id']
+
+
+def get_session(conn, session_id, user_id):
+    """Returns the session if it exists and belongs to the user, else None."""
+    return conn.execute(
+        'SELECT * FROM interview_sessions WHERE id = ? AND user_id = ?',
+        (session_id, user_id)
+    ).fetchone()
+
+
+def get_active_session(conn, user_id):
+    """Returns the user's newest interview that has not been evaluated yet, or None."""
+    return conn.execute(
+        """
+        SELECT * FROM interview_sessions
+        WHERE user_id = ? AND status = 'active'
+        ORDER BY id DESC
+        LIMIT 1
+        """,
+        (user_id,)
+    ).fetchone()
+
+
+def add_turn(conn, session_id, role, content):
+    """Appends a message ('user' or 'assistant') to the session and returns its position. Does not commit."""
+    position = conn.execute(
+        """
+        UPDATE interview_sessions
+        SET turn_count = turn_count + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        RETURNING turn_count
+        """,
+        (session_id,)
+    ).fetchone()['turn_count']
+    conn.execute(
+        'INSERT INTO interview_turns (session_id, position, role, content) VALUES (?, ?, ?, ?)',
+        (session_id, position, role, content)
+    )
+    return position
+
+
+def get_turns(conn, session_id):
+    """Returns the session's messages in order, as chat messages ({'role', 'content'})."""
+    rows = conn.execute(
+        'SELECT role, content FROM interview_turns WHERE session_id = ? ORDER BY position',
+        (session_id,)
+    ).fetchall()
+    return [{"role": row['role'], "content": row['content']} for row in rows]
+
+
+def build_transcript(turns):
+    """Plain text transcript for the evaluator."""
+    speakers = {'user': 'Candidate', 'assistant': 'Interviewer'}
+    return "".join(
+        f"{speakers[turn['role']]}: {turn['content']}\n\n" for turn in turns if turn.get('role') in speakers
+    )
+
+
+def get_unscored_answers(conn, session_id, position=None):
+    """
+    Returns the session's scorable answers that have no score yet (only the
+    one at `position`, if given), as rows with position, question and answer.
+    """
+    return conn.execute(
+        """
+        SELECT a.position, q.content AS question, a.content AS answer
+        FROM interview_turns a
+        JOIN interview_turns q
+            ON q.session_id = a.session_id AND q.position = a.position - 1 AND q.role = 'assistant'
+        LEFT JOIN interview_turn_scores s
+            ON s.session_id = a.session_id AND s.position = a.position
+        WHERE a.session_id = ? AND a.role = 'user' AND q.position > 1 AND s.position IS NULL
+          AND (? IS NULL OR a.position = ?)
+        ORDER BY a.position
+        """,
+        (session_id, position, position)
+    ).fetchall()
+
+
+def save_answer_score(conn, session_id, position, scores):
+    """Stores an answer's scores; a score that is already there is kept. Does not commit."""
+    conn.execute(
+        """
+        INSERT INTO interview_turn_scores (session_id, position, score_confidence, score_clarity, note)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (session_id, position) DO NOTHING
+        """,
+        (session_id, position, scores['score_confidence'], scores['score_clarity'], scores['note'])
+    )
+
+
+def get_answer_scores(conn, session_id):
+    """Returns every scored answer of the session with its question, in order."""
+    rows = conn.execute(
+        """
+        SELECT s.position, q.content AS question, s.score_confidence, s.score_clarity, s.note
+        FROM interview_turn_scores s
+        JOIN interview_turns q ON q.session_id = s.session_id AND q.position = s.position - 1
+        WHERE s.session_id = ?
+        ORDER BY s.position
+        """,
+        (session_id,)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def aggregate_scores(scored_answers):
+    """Overall confidence and clarity: the average over all scored answers."""
+    count = len(scored_answers)
+    return {
+        "score_confidence": round(sum(answer['score_confidence'] for answer in scored_answers) / count),
+        "score_clarity": round(sum(answer['score_clarity'] for answer in scored_answers) / count),
+    }
+
+
+def notes_as_feedback(scored_answers):
+    """
+    Feedback without an AI call: the notes on the (up to) three weakest
+    answers and the two strongest others. Used when the synthesis call fails.
+    """
+    ranked = sorted(scored_answers, key=lambda answer: answer['score_confidence'] + answer['score_clarity'])
+    weakest = ranked[:3]
+    strongest = [answer for answer in reversed(ranked) if answer not in weakest][:2]
+    return {
+        "feedback": [answer['note'] for answer in weakest],
+        "strengths": [answer['note'] for answer in strongest],
+    }
+
+
+def mark_evaluated(conn, session_id, interview_id):
+    """
+    Closes the session and links it to its saved evaluation. Returns False if
+    the session was not active any more (evaluated meanwhile). Does not commit.
+    """
+    cursor = conn.execute(
+        """
+        UPDATE interview_sessions SET status = 'evaluated', interview_id = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = 'active'
+        """,
+        (interview_id, session_id)
+    )
+    return cursor.rowcount == 1
+
+
+def delete_user(conn, user_id):
+    """Removes a user's interview sessions with their turns and scores (account deletion). Does not commit."""
+    conn.execute(
+        'DELETE FROM interview_turn_scores WHERE session_id IN (SELECT id FROM interview_sessions WHERE user_id = ?)',
+        (user_id,)
+    )
+    conn.execute(
+        'DELETE FROM interview_turns WHERE session_id IN (SELECT id FROM interview_sessions WHERE user_id = ?)',
+        (user_id,)
+    )
+    conn.execute('DELETE FROM interview_sessions WHERE user_id = ?', (user_id,))
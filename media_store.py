@@ -0,0 +1,190 @@
+import hashlib
+import os
+import sys
+import tempfile
+
+# --- Content-Addressed Media Store ---
+# Uploads are streamed to a temp file in chunks while being hashed, then moved
+# to static/uploads/<ab>/<cd>/<sha256>.<ext>. The same file uploaded twice ends
+# up at the same path, so it is only stored once. media_blobs counts how many
+# posts use each file, keyed like the path on (sha256, ext); collect_garbage()
+# deletes files nobody uses any more.
+# Files are served by the /media/ route in app.py.
+
+UPLOAD_ROOT = os.path.join('static', 'uploads')
+URL_PREFIX = '/media/'
+CHUNK_SIZE = 64 * 1024
+MB = 1024 * 1024
+
+# Allowed extensions and the largest upload accepted for each
+MEDIA_SIZE_LIMITS = {
+    'png': 5 * MB,
+    'jpg': 5 * MB,
+    'jpeg': 5 * MB,
+    'gif': 10 * MB,
+    'mp4': 50 * MB,
+    'mov': 50 * MB,
+}
+# Flask's MAX_CONTENT_LENGTH: the biggest file plus room for the other form fields
+MAX_REQUEST_BYTES = max(MEDIA_SIZE_LIMITS.values()) + 1 * MB
+# A released blob is kept this long, in case the same file is uploaded again meanwhile
+GARBAGE_GRACE_SECONDS = 3600
+
+
+def get_extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+def blob_path(sha256, ext):
+    """Sharded location of a blob on disk: static/uploads/ab/cd/abcd....ext"""
+    return os.path.join(UPLOAD_ROOT, sha256[:2], sha256[2:4], f"{sha256}.{ext}")
+
+
+def blob_url(sha256, ext):
+    return f"{URL_PREFIX}{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}"
+
+
+def parse_blob_url(media_url):
+    """Returns (sha256, ext) for a content-addressed media URL, or None (e.g. legacy uploads)."""
+    if not media_url or not media_url.startswith(URL_PREFIX):
+        return None
+    parts = media_url[len(URL_PREFIX):].split('/')
+    if len(parts) != 3:
+        return None
+    sha256, _, ext = parts[2].partition('.')
+    if len(sha256) != 64 or parts[0] != sha256[:2] or parts[1] != sha256[2:4]:
+        return None
+    return sha256, ext
+
+
+def save_upload(file_storage):
+    """
+    Streams an uploaded file to disk, hashing it on the way.
+    Returns (media, error_message, status_code); media is a dict with
+    sha256, ext, size and url. Nothing is recorded in the database yet;
+    call add_reference() in the transaction that saves the post.
+    """
+    ext = get_extension(file_storage.filename or '')
+    limit = MEDIA_SIZE_LIMITS.get(ext)
+    if limit is None:
+        return None, "File type not allowed.", 400
+
+    os.makedirs(UPLOAD_ROOT, exist_ok=True)
+    # Same directory as the final location, so the move below is an atomic rename
+    fd, temp_path = tempfile.mkstemp(prefix='.upload-', dir=UPLOAD_ROOT)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    return None, f"File is too large (max {limit // MB} MB for .{ext} files).", 413
+                digest.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            return None, "Uploaded file is empty.", 400
+
+        sha256 = digest.hexdigest()
+        final_path = blob_path(sha256, ext)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        # Identical content lands on the same path, so a repeat upload just replaces it with itself
+        os.replace(temp_path, final_path)
+        return {"sha256": sha256, "ext": ext, "size": size, "url": blob_url(sha256, ext)}, None, 200
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def add_reference(conn, media):
+    """Records one more post using this blob. Does not commit."""
+    conn.execute(
+        """
+        INSERT INTO media_blobs (sha256, ext, size, ref_count) VALUES (?, ?, ?, 1)
+        ON CONFLICT (sha256, ext) DO UPDATE SET
+            ref_count = ref_count + 1,
+            released_at = NULL
+        """,
+        (media['sha256'], media['ext'], media['size'])
+    )
+
+
+def discard_upload(conn, media):
+    """
+    For an upload whose post was not saved: records the blob as unused (if no
+    post has it yet), so collect_garbage() removes the file. Does not commit.
+    """
+    conn.execute(
+        """
+        INSERT INTO media_blobs (sha256, ext, size, ref_count, released_at) VALUES (?, ?, ?, 0, CURRENT_TIMESTAMP)
+        ON CONFLICT (sha256, ext) DO NOTHING
+        """,
+        (media['sha256'], media['ext'], media['size'])
+    )
+
+
+def release(conn, media_urls):
+    """Drops one reference per media URL (from deleted posts). Legacy URLs are ignored. Does not commit."""
+    for media_url in media_urls:
+        parsed = parse_blob_url(media_url)
+        if parsed is None:
+            continue
+        conn.execute(
+            """
+            UPDATE media_blobs
+            SET ref_count = ref_count - 1,
+                released_at = CASE WHEN ref_count = 1 THEN CURRENT_TIMESTAMP ELSE released_at END
+            WHERE sha256 = ? AND ext = ? AND ref_count > 0
+            """,
+            parsed
+        )
+
+
+def collect_garbage(conn, grace_seconds=GARBAGE_GRACE_SECONDS):
+    """
+    Deletes blobs that no post has used for grace_seconds, rows first and then
+    files. Commits, and returns the number of files removed.
+    """
+    rows = conn.execute(
+        """
+        SELECT sha256, ext FROM media_blobs
+        WHERE ref_count = 0 AND released_at <= DATETIME('now', ?)
+        """,
+        (f'-{int(grace_seconds)} seconds',)
+    ).fetchall()
+    # Re-check ref_count per row: a blob uploaded again since the SELECT is kept
+    unused = []
+    for row in rows:
+        result = conn.execute(
+            'DELETE FROM media_blobs WHERE sha256 = ? AND ext = ? AND ref_count = 0', (row['sha256'], row['ext'])
+        )
+        if result.rowcount == 1:
+            unused.append(row)
+    conn.commit()
+
+    removed = 0
+    for row in unused:
+        path = blob_path(row['sha256'], row['ext'])
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not delete media blob {path}: {e}")
+    return removed
+
+
+if __name__ == '__main__':
+    # Usage: python media_store.py gc
+    import db
+    if sys.argv[1:] != ['gc']:
+        sys.exit("Usage: python media_store.py gc")
+    conn = db.connect()
+    try:
+        print(f"Removed {collect_garbage(conn)} unused media files.")
+    finally:
+        conn.close()
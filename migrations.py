@@ -0,0 +1,625 @@
+import sqlite3
+import sys
+
+# --- Schema Migrations ---
+# The database schema version is stored in PRAGMA user_version. Each migration
+# runs in its own transaction and bumps the version, so a database is always
+# at exactly one known version and a half-applied migration is rolled back.
+# Append new migrations to the end of MIGRATIONS; never edit or reorder old ones.
+# Migrations hold their own SQL rather than calling app modules, so a later
+# change to those modules never changes what an old migration does.
+
+DATABASE = 'database.db'
+
+
+def _column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _add_column_if_missing(conn, table, column, definition):
+    if not _column_exists(conn, table, column):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def baseline_schema(conn):
+    """
+    Creates the original tables, or brings a database built with the old
+    init_db.py / update_db*.py / add_*_table.py scripts up to the same shape.
+    Nothing is dropped.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        email TEXT NOT NULL UNIQUE,
+        password_hash TEXT NOT NULL,
+        points INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        current_streak INTEGER DEFAULT 0,
+        last_activity_date TEXT DEFAULT NULL,
+        exam_group TEXT DEFAULT NULL
+    );
+    """)
+    _add_column_if_missing(conn, 'users', 'current_streak', 'INTEGER DEFAULT 0')
+    _add_column_if_missing(conn, 'users', 'last_activity_date', 'TEXT DEFAULT NULL')
+    _add_column_if_missing(conn, 'users', 'exam_group', 'TEXT DEFAULT NULL')
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS quizzes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        subject TEXT NOT NULL
+    );
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        quiz_id INTEGER NOT NULL,
+        question_text TEXT NOT NULL,
+        option_a TEXT NOT NULL,
+        option_b TEXT NOT NULL,
+        option_c TEXT NOT NULL,
+        option_d TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        FOREIGN KEY (quiz_id) REFERENCES quizzes (id)
+    );
+    """)
+
+    # user_progress supports both static quizzes (quiz_id) and AI quizzes (ai_quiz_topic).
+    # Very old databases had a NOT NULL quiz_id, which SQLite can only relax by rebuilding the table.
+    quiz_id_not_nullable = any(
+        row[1] == 'quiz_id' and row[3] == 1 for row in conn.execute("PRAGMA table_info(user_progress)")
+    )
+    if quiz_id_not_nullable:
+        conn.execute("ALTER TABLE user_progress RENAME TO user_progress_old")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_progress (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        quiz_id INTEGER,
+        ai_quiz_topic TEXT DEFAULT NULL,
+        score INTEGER NOT NULL,
+        total_questions INTEGER DEFAULT NULL,
+        completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (quiz_id) REFERENCES quizzes (id)
+    );
+    """)
+    if quiz_id_not_nullable:
+        old_columns = [row[1] for row in conn.execute("PRAGMA table_info(user_progress_old)")]
+        columns = ", ".join(old_columns)
+        conn.execute(f"INSERT INTO user_progress ({columns}) SELECT {columns} FROM user_progress_old")
+        conn.execute("DROP TABLE user_progress_old")
+    _add_column_if_missing(conn, 'user_progress', 'ai_quiz_topic', 'TEXT DEFAULT NULL')
+    _add_column_if_missing(conn, 'user_progress', 'total_questions', 'INTEGER DEFAULT NULL')
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schedule (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT,
+        is_complete INTEGER DEFAULT 0,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+    """)
+    _add_column_if_missing(conn, 'schedule', 'is_complete', 'INTEGER DEFAULT 0')
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        exam_group TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        parent_post_id INTEGER DEFAULT NULL,
+        media_url TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+    """)
+    _add_column_if_missing(conn, 'posts', 'parent_post_id', 'INTEGER DEFAULT NULL')
+    _add_column_if_missing(conn, 'posts', 'media_url', 'TEXT')
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS badges (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL,
+        icon TEXT NOT NULL
+    );
+    """)
+    conn.executemany(
+        "INSERT OR IGNORE INTO badges (id, name, description, icon) VALUES (?, ?, ?, ?)",
+        [
+            (1, 'First Steps', 'Registered for an account', 'play-circle'),
+            (2, 'Quiz Taker', 'Completed your first quiz', 'check-circle'),
+            (3, 'Streak Starter', 'Achieved a 3-day study streak', 'flame'),
+            (4, 'Community Poster', 'Made your first post in the community', 'message-square'),
+            (5, 'Quiz Master', 'Completed 10 quizzes', 'award')
+        ]
+    )
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_badges (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        badge_id INTEGER NOT NULL,
+        earned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+        FOREIGN KEY (badge_id) REFERENCES badges (id) ON DELETE CASCADE
+    );
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS interviews (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        transcript TEXT NOT NULL,
+        score_confidence INTEGER,
+        score_clarity INTEGER,
+        feedback TEXT,
+        completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        strengths TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    );
+    """)
+    _add_column_if_missing(conn, 'interviews', 'strengths', 'TEXT')
+
+    # Old static-quiz attempts were saved without a question count; fill it in one statement.
+    conn.execute("""
+    UPDATE user_progress
+    SET total_questions = (SELECT COUNT(*) FROM questions q WHERE q.quiz_id = user_progress.quiz_id)
+    WHERE quiz_id IS NOT NULL
+      AND total_questions IS NULL
+      AND EXISTS (SELECT 1 FROM questions q WHERE q.quiz_id = user_progress.quiz_id)
+    """)
+
+
+def coach_feedback_table(conn):
+    """Memoized AI coach feedback per user and page."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS coach_feedback (
+        user_id INTEGER NOT NULL,
+        scope TEXT NOT NULL,
+        input_digest TEXT NOT NULL,
+        feedback TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, scope),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    );
+    """)
+
+
+def hot_query_indexes(conn):
+    """
+    Indexes for every hot query in app.py.
+    check_query_plans.py fails if a query falls back to a full table scan.
+    """
+    # The unique badge index can't be built while duplicate awards exist, so keep the earliest one.
+    conn.execute("""
+    DELETE FROM user_badges
+    WHERE id NOT IN (SELECT MIN(id) FROM user_badges GROUP BY user_id, badge_id)
+    """)
+    # Dashboard/profile history: WHERE user_id = ? ORDER BY completed_at
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_progress_user_completed ON user_progress (user_id, completed_at)")
+    # Community feed: WHERE exam_group = ? AND channel = ? AND parent_post_id IS NULL ORDER BY created_at
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_feed ON posts (exam_group, channel, parent_post_id, created_at)")
+    # Replies: WHERE parent_post_id = ? ORDER BY created_at
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_parent ON posts (parent_post_id, created_at)")
+    # Badge check (first post) and account deletion: WHERE user_id = ? AND parent_post_id IS NULL
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posts_user ON posts (user_id, parent_post_id)")
+    # Today's tasks: WHERE user_id = ? AND start_time in [today, tomorrow)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_schedule_user_start ON schedule (user_id, start_time)")
+    # One row per earned badge; award_badge relies on this with INSERT OR IGNORE
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_user_badges_user_badge ON user_badges (user_id, badge_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_badges_name ON badges (name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_questions_quiz ON questions (quiz_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_interviews_user_completed ON interviews (user_id, completed_at)")
+
+
+def stats_rollups(conn):
+    """Per-user running totals of user_progress (see rollups.py), backfilled from history."""
+    graded_sums = """
+        COUNT(*),
+        SUM(CASE WHEN p.total_questions > 0 THEN COALESCE(p.score, 0) ELSE 0 END),
+        SUM(CASE WHEN p.total_questions > 0 THEN p.total_questions ELSE 0 END)
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER PRIMARY KEY,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        scored INTEGER NOT NULL DEFAULT 0,
+        possible INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    );
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_subject_stats (
+        user_id INTEGER NOT NULL,
+        subject TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        scored INTEGER NOT NULL DEFAULT 0,
+        possible INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, subject),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    );
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_topic_stats (
+        user_id INTEGER NOT NULL,
+        topic TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        scored INTEGER NOT NULL DEFAULT 0,
+        possible INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, topic),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    );
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_daily_stats (
+        user_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        scored INTEGER NOT NULL DEFAULT 0,
+        possible INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    );
+    """)
+    conn.execute(f"""
+    INSERT INTO user_stats (user_id, attempts, scored, possible)
+    SELECT p.user_id, {graded_sums}
+    FROM user_progress p
+    GROUP BY p.user_id
+    """)
+    conn.execute(f"""
+    INSERT INTO user_daily_stats (user_id, day, attempts, scored, possible)
+    SELECT p.user_id, DATE(p.completed_at), {graded_sums}
+    FROM user_progress p
+    GROUP BY p.user_id, DATE(p.completed_at)
+    """)
+    conn.execute(f"""
+    INSERT INTO user_subject_stats (user_id, subject, attempts, scored, possible)
+    SELECT p.user_id, q.subject, {graded_sums}
+    FROM user_progress p JOIN quizzes q ON p.quiz_id = q.id
+    GROUP BY p.user_id, q.subject
+    """)
+    conn.execute(f"""
+    INSERT INTO user_topic_stats (user_id, topic, attempts, scored, possible)
+    SELECT p.user_id, p.ai_quiz_topic, {graded_sums}
+    FROM user_progress p
+    WHERE p.ai_quiz_topic IS NOT NULL AND p.ai_quiz_topic != ''
+    GROUP BY p.user_id, p.ai_quiz_topic
+    """)
+
+
+def post_reply_counts(conn):
+    """Denormalized reply count on each top-level post, kept up to date by add_post/delete_post."""
+    _add_column_if_missing(conn, 'posts', 'reply_count', 'INTEGER NOT NULL DEFAULT 0')
+    conn.execute("""
+    UPDATE posts
+    SET reply_count = (SELECT COUNT(*) FROM posts r WHERE r.parent_post_id = posts.id)
+    WHERE parent_post_id IS NULL
+    """)
+
+
+def posts_search_index(conn):
+    """
+    FTS5 index over posts.content (see search_index.py). It is an external-content
+    table, so the text is only stored once; the triggers keep it in sync.
+    """
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+        content,
+        content='posts',
+        content_rowid='id',
+        tokenize='porter unicode61'
+    );
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_fts (rowid, content) VALUES (new.id, new.content);
+    END;
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_fts (posts_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END;
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF content ON posts BEGIN
+        INSERT INTO posts_fts (posts_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO posts_fts (rowid, content) VALUES (new.id, new.content);
+    END;
+    """)
+    conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+
+
+def media_blobs_table(conn):
+    """Reference counts for content-addressed uploads (see media_store.py)."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS media_blobs (
+        sha256 TEXT PRIMARY KEY,
+        ext TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        ref_count INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        released_at TIMESTAMP DEFAULT NULL
+    );
+    """)
+    # Garbage collection only looks at unreferenced blobs
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_blobs_unused ON media_blobs (released_at) WHERE ref_count = 0")
+
+
+def media_urls_to_media_route(conn):
+    """Uploads are now served by /media/ (with Range and caching support) instead of /static/uploads/."""
+    conn.execute("""
+    UPDATE posts
+    SET media_url = '/media/' || SUBSTR(media_url, LENGTH('/static/uploads/') + 1)
+    WHERE media_url LIKE '/static/uploads/%'
+    """)
+
+
+def badge_counters(conn):
+    """Counters behind the declarative badge rules (see badges.py), backfilled from existing data."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_counters (
+        user_id INTEGER NOT NULL,
+        counter TEXT NOT NULL,
+        value INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, counter),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    );
+    """)
+    # Backfill awards: WHERE counter = ? AND value >= threshold
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_counters_counter_value ON user_counters (counter, value)")
+    # Badges are looked up and seeded by name
+    conn.execute("DROP INDEX IF EXISTS idx_badges_name")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_badges_name_unique ON badges (name)")
+
+    # The badge rules as they were when counters were introduced: (badge, description, icon, counter, threshold)
+    badge_rules = [
+        ("First Steps", "Registered for an account", "play-circle", "registered", 1),
+        ("Quiz Taker", "Completed your first quiz", "check-circle", "quizzes_completed", 1),
+        ("Quiz Master", "Completed 10 quizzes", "award", "quizzes_completed", 10),
+        ("Community Poster", "Made your first post in the community", "message-square", "posts_created", 1),
+        ("Streak Starter", "Achieved a 3-day study streak", "flame", "best_streak", 3),
+    ]
+    counter_sources = {
+        "registered": "SELECT id AS user_id, 1 AS value FROM users",
+        "quizzes_completed": "SELECT user_id, COUNT(*) AS value FROM user_progress GROUP BY user_id",
+        "posts_created": "SELECT user_id, COUNT(*) AS value FROM posts WHERE parent_post_id IS NULL GROUP BY user_id",
+        "best_streak": "SELECT id AS user_id, current_streak AS value FROM users WHERE current_streak > 0",
+    }
+    conn.executemany(
+        "INSERT OR IGNORE INTO badges (name, description, icon) VALUES (?, ?, ?)",
+        [(badge, description, icon) for badge, description, icon, _, _ in badge_rules]
+    )
+    for counter, source_sql in counter_sources.items():
+        conn.execute(
+            f"""
+            INSERT INTO user_counters (user_id, counter, value)
+            SELECT source.user_id, ?, source.value FROM ({source_sql}) AS source
+            WHERE true
+            ON CONFLICT (user_id, counter) DO UPDATE SET value = MAX(value, excluded.value)
+            """,
+            (counter,)
+        )
+    for badge, _, _, counter, threshold in badge_rules:
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO user_badges (user_id, badge_id)
+            SELECT c.user_id, b.id
+            FROM user_counters c
+            JOIN badges b ON b.name = ?
+            WHERE c.counter = ? AND c.value >= ?
+            """,
+            (badge, counter, threshold)
+        )
+
+
+def user_activity_log(conn):
+    """
+    One row per user per active day (see streaks.py). Seeded from each user's
+    current streak and the days they finished quizzes.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_activity (
+        user_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        PRIMARY KEY (user_id, day),
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+    """)
+    conn.execute("""
+    WITH RECURSIVE streak_days (user_id, day, remaining) AS (
+        SELECT id, last_activity_date, current_streak - 1
+        FROM users
+        WHERE current_streak > 0 AND last_activity_date IS NOT NULL
+        UNION ALL
+        SELECT user_id, DATE(day, '-1 day'), remaining - 1
+        FROM streak_days
+        WHERE remaining > 0
+    )
+    INSERT OR IGNORE INTO user_activity (user_id, day)
+    SELECT user_id, day FROM streak_days
+    """)
+    conn.execute("""
+    INSERT OR IGNORE INTO user_activity (user_id, day)
+    SELECT DISTINCT user_id, DATE(completed_at) FROM user_progress WHERE completed_at IS NOT NULL
+    """)
+    # The nightly streak rollover only looks at users with a running streak
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_active_streak ON users (last_activity_date) WHERE current_streak > 0")
+
+
+def catalog_version_counter(conn):
+    """
+    A single-row version counter for the catalog cache (see catalog.py),
+    bumped by triggers on every write to quizzes, questions and badges.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS catalog_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    );
+    """)
+    conn.execute("INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 1)")
+    for table in ('quizzes', 'questions', 'badges'):
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_catalog_{event.lower()} AFTER {event} ON {table}
+            BEGIN
+                UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+            END;
+            """)
+
+
+def interview_sessions_tables(conn):
+    """Server-side interview sessions and their messages (see interview_sessions.py)."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS interview_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        exam_group TEXT,
+        status TEXT NOT NULL DEFAULT 'active',
+        turn_count INTEGER NOT NULL DEFAULT 0,
+        interview_id INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+        FOREIGN KEY (interview_id) REFERENCES interviews (id) ON DELETE SET NULL
+    );
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS interview_turns (
+        session_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (session_id, position),
+        FOREIGN KEY (session_id) REFERENCES interview_sessions (id) ON DELETE CASCADE
+    );
+    """)
+    # Resuming the newest unfinished interview
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_interview_sessions_user_status ON interview_sessions (user_id, status, id)")
+
+
+def interview_turn_scores_table(conn):
+    """Per-answer interview scores, filled in the background (see interview_sessions.py)."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS interview_turn_scores (
+        session_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        score_confidence INTEGER NOT NULL,
+        score_clarity INTEGER NOT NULL,
+        note TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (session_id, position),
+        FOREIGN KEY (session_id, position) REFERENCES interview_turns (session_id, position) ON DELETE CASCADE
+    );
+    """)
+
+
+def media_blobs_by_extension(conn):
+    """
+    Keys media_blobs on (sha256, ext): the same bytes uploaded as .jpg and .jpeg
+    are two files on disk, and each needs its own row so GC can remove both.
+    Reference counts are recounted from the posts that use each file.
+    """
+    conn.execute("""
+    CREATE TABLE media_blobs_new (
+        sha256 TEXT NOT NULL,
+        ext TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        ref_count INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        released_at TIMESTAMP DEFAULT NULL,
+        PRIMARY KEY (sha256, ext)
+    );
+    """)
+    conn.execute("""
+    INSERT INTO media_blobs_new (sha256, ext, size, ref_count, created_at, released_at)
+    SELECT sha256, ext, size, 0, created_at, COALESCE(released_at, CURRENT_TIMESTAMP) FROM media_blobs
+    """)
+    # Content-addressed URLs: /media/<ab>/<cd>/<sha256>.<ext>
+    conn.execute("""
+    INSERT INTO media_blobs_new (sha256, ext, size, ref_count)
+    SELECT SUBSTR(p.media_url, 14, 64), SUBSTR(p.media_url, 79),
+           COALESCE((SELECT b.size FROM media_blobs b WHERE b.sha256 = SUBSTR(p.media_url, 14, 64)), 0),
+           COUNT(*)
+    FROM posts p
+    WHERE p.media_url LIKE '/media/__/__/%' AND SUBSTR(p.media_url, 78, 1) = '.'
+    GROUP BY SUBSTR(p.media_url, 14, 64), SUBSTR(p.media_url, 79)
+    ON CONFLICT (sha256, ext) DO UPDATE SET ref_count = excluded.ref_count, released_at = NULL
+    """)
+    conn.execute("DROP TABLE media_blobs")
+    conn.execute("ALTER TABLE media_blobs_new RENAME TO media_blobs")
+    # Garbage collection only looks at unreferenced blobs
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_blobs_unused ON media_blobs (released_at) WHERE ref_count = 0")
+
+
+MIGRATIONS = [
+    ('baseline_schema', baseline_schema),
+    ('coach_feedback_table', coach_feedback_table),
+    ('hot_query_indexes', hot_query_indexes),
+    ('stats_rollups', stats_rollups),
+    ('post_reply_counts', post_reply_counts),
+    ('posts_search_index', posts_search_index),
+    ('media_blobs_table', media_blobs_table),
+    ('media_urls_to_media_route', media_urls_to_media_route),
+    ('badge_counters', badge_counters),
+    ('user_activity_log', user_activity_log),
+    ('catalog_version_counter', catalog_version_counter),
+    ('interview_sessions_tables', interview_sessions_tables),
+    ('interview_turn_scores_table', interview_turn_scores_table),
+    ('media_blobs_by_extension', media_blobs_by_extension),
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    """
+    Applies every pending migration to an open connection, each in its own
+    transaction. The connection must be in autocommit mode (isolation_level=None).
+    Returns the resulting schema version.
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version >= LATEST_VERSION:
+        return version # Fast path: already current
+
+    for number, (name, step) in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have applied it while we waited for the lock.
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= number:
+                conn.execute('COMMIT')
+                continue
+            step(conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.execute('COMMIT')
+            print(f"Applied migration {number}: {name}")
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    return LATEST_VERSION
+
+
+def run_migrations(db_path=DATABASE):
+    """Brings the database file at db_path up to the latest schema version."""
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DATABASE
+    print(f"Database {db_path} is at schema version {run_migrations(db_path)}.")
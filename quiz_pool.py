@@ -0,0 +1,228 @@
+import sqlite3
+import json
+import threading
+import time
+import uuid
+import ai_helper
+
+# --- Quiz Pool Configuration ---
+# Ready-made AI quizzes, stored per (topic, difficulty, number of questions, mode).
+# A served quiz is removed from the pool so nobody gets the same quiz twice,
+# and a background refiller keeps keys in steady recent demand topped up.
+POOL_DB_PATH = 'quiz_pool.db'
+POOL_TARGET_DEPTH = 3
+POOL_MAX_QUESTIONS = 20
+# Keys requested at least POOL_MIN_DEMAND times within this window count as
+# "hot" and get refilled; one-off topics are generated on demand only.
+POOL_HOT_WINDOW = 24 * 3600
+POOL_MIN_DEMAND = 3
+POOL_MAX_HOT_KEYS = 50
+POOL_ITEM_TTL = 7 * 24 * 3600
+POOL_REFILL_INTERVAL = 30
+
+_schema_ready = False
+_refiller = None
+_refiller_lock = threading.Lock()
+_wake = threading.Event()
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "refilled": 0, "rejected": 0}
+
+
+def _connect():
+    """Opens an autocommit connection to the pool database, creating the tables on first use."""
+    global _schema_ready
+    conn = sqlite3.connect(POOL_DB_PATH, timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _schema_ready:
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_pool_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pool_key TEXT NOT NULL,
+            quiz TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_quiz_pool_items_key ON quiz_pool_items (pool_key, id)')
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_pool_demand (
+            pool_key TEXT PRIMARY KEY,
+            topic TEXT NOT NULL,
+            difficulty TEXT NOT NULL,
+            num_questions INTEGER NOT NULL,
+            mode TEXT NOT NULL,
+            requests INTEGER NOT NULL DEFAULT 0,
+            last_requested REAL NOT NULL
+        );
+        """)
+        _schema_ready = True
+    return conn
+
+
+def _count(stat, amount=1):
+    with _stats_lock:
+        _stats[stat] += amount
+
+
+def normalize_topic(topic):
+    """'  Ohm's  LAW ' and "ohm's law" share a pool."""
+    return " ".join(str(topic).lower().split())
+
+
+def _pool_params(topic, num_questions, difficulty, is_late_night, is_distracted):
+    """Returns (pool_key, mode, num_questions), mirroring how generate_ai_quiz treats focus modes."""
+    if is_distracted:
+        mode, num_questions = 'distracted', 1
+    elif is_late_night:
+        mode = 'late_night'
+    else:
+        mode = 'normal'
+    pool_key = "|".join([normalize_topic(topic), str(difficulty), str(num_questions), mode])
+    return pool_key, mode, num_questions
+
+
+def is_valid_quiz(quiz_data, num_questions):
+    """Only complete, well-formed quizzes are pooled (a bad one would be served to someone later)."""
+    if not isinstance(quiz_data, dict) or not isinstance(quiz_data.get("quiz"), list):
+        return False
+    if len(quiz_data["quiz"]) != num_questions:
+        return False
+    for item in quiz_data["quiz"]:
+        if not isinstance(item, dict) or not isinstance(item.get("question"), str):
+            return False
+        options = item.get("options")
+        if not isinstance(options, list) or len(options) < 2:
+            return False
+        answer_index = item.get("answer_index")
+        if not isinstance(answer_index, int) or not 0 <= answer_index < len(options):
+            return False
+    return True
+
+
+def take(topic, num_questions=5, difficulty="Medium", is_late_night=False, is_distracted=False):
+    """
+    Returns a pooled quiz for these settings and removes it from the pool,
+    or None if the pool is empty. Either way the request counts as demand;
+    once a key is hot, the refiller is woken to keep it stocked.
+    """
+    if not 1 <= num_questions <= POOL_MAX_QUESTIONS:
+        return None
+    pool_key, mode, num_questions = _pool_params(topic, num_questions, difficulty, is_late_night, is_distracted)
+    now = time.time()
+
+    conn = _connect()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            requests = conn.execute(
+                """
+                INSERT INTO quiz_pool_demand (pool_key, topic, difficulty, num_questions, mode, requests, last_requested)
+                VALUES (?, ?, ?, ?, ?, 1, ?)
+                ON CONFLICT (pool_key) DO UPDATE SET
+                    requests = requests + 1,
+                    last_requested = excluded.last_requested
+                RETURNING requests
+                """,
+                (pool_key, topic, difficulty, num_questions, mode, now)
+            ).fetchone()['requests']
+            row = conn.execute(
+                'SELECT id, quiz FROM quiz_pool_items WHERE pool_key = ? AND created_at > ? ORDER BY id LIMIT 1',
+                (pool_key, now - POOL_ITEM_TTL)
+            ).fetchone()
+            if row is not None:
+                conn.execute('DELETE FROM quiz_pool_items WHERE id = ?', (row['id'],))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    except sqlite3.Error as e:
+        print(f"Quiz pool error: {e}")
+        return None
+    finally:
+        conn.close()
+
+    if requests >= POOL_MIN_DEMAND:
+        _wake.set()
+    if row is None:
+        _count("misses")
+        return None
+    _count("hits")
+    return json.loads(row['quiz'])
+
+
+def refill_once():
+    """Tops up every hot key to POOL_TARGET_DEPTH and drops expired items and cold keys."""
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute('DELETE FROM quiz_pool_items WHERE created_at <= ?', (now - POOL_ITEM_TTL,))
+        conn.execute(
+            'DELETE FROM quiz_pool_items WHERE pool_key IN (SELECT pool_key FROM quiz_pool_demand WHERE last_requested <= ?)',
+            (now - POOL_HOT_WINDOW,)
+        )
+        conn.execute('DELETE FROM quiz_pool_demand WHERE last_requested <= ?', (now - POOL_HOT_WINDOW,))
+        hot_keys = conn.execute(
+            """
+            SELECT d.*, (SELECT COUNT(*) FROM quiz_pool_items i WHERE i.pool_key = d.pool_key) AS depth
+            FROM quiz_pool_demand d
+            WHERE d.requests >= ?
+            ORDER BY d.requests DESC
+            LIMIT ?
+            """,
+            (POOL_MIN_DEMAND, POOL_MAX_HOT_KEYS)
+        ).fetchall()
+
+        for key in hot_keys:
+            for _ in range(POOL_TARGET_DEPTH - key['depth']):
+                quiz_data = ai_helper.generate_ai_quiz(
+                    key['topic'],
+                    key['num_questions'],
+                    key['difficulty'],
+                    is_late_night=(key['mode'] == 'late_night'),
+                    is_distracted=(key['mode'] == 'distracted'),
+                    variation=uuid.uuid4().hex[:8]
+                )
+                if not is_valid_quiz(quiz_data, key['num_questions']):
+                    _count("rejected")
+                    break # Don't hammer the AI for a topic it keeps failing on
+                conn.execute(
+                    'INSERT INTO quiz_pool_items (pool_key, quiz, created_at) VALUES (?, ?, ?)',
+                    (key['pool_key'], json.dumps(quiz_data), time.time())
+                )
+                _count("refilled")
+    finally:
+        conn.close()
+
+
+def _refill_loop():
+    while True:
+        _wake.wait(POOL_REFILL_INTERVAL)
+        _wake.clear()
+        try:
+            refill_once()
+        except Exception as e:
+            print(f"Quiz pool refill error: {e}")
+
+
+def start_refiller():
+    """Starts the background refill thread for this process (only once)."""
+    global _refiller
+    with _refiller_lock:
+        if _refiller is None:
+            _refiller = threading.Thread(target=_refill_loop, name="quiz-pool-refiller", daemon=True)
+            _refiller.start()
+
+
+def get_stats():
+    """Returns pool hit/miss counters plus the number of stored quizzes."""
+    with _stats_lock:
+        stats = dict(_stats)
+    conn = _connect()
+    try:
+        stats["pooled"] = conn.execute('SELECT COUNT(*) FROM quiz_pool_items').fetchone()[0]
+        stats["hot_keys"] = conn.execute(
+            'SELECT COUNT(*) FROM quiz_pool_demand WHERE requests >= ?', (POOL_MIN_DEMAND,)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+    return stats
@@ -0,0 +1,194 @@
+import sys
+
+# --- Per-User Stats Rollups ---
+# Running totals of user_progress, so the dashboard, profile and heatmap read
+# one row per subject/topic/day instead of a user's whole quiz history.
+# record_attempt() must run in the same transaction as the user_progress
+# INSERT; rebuild() recomputes everything from user_progress.
+#
+# Only attempts with total_questions > 0 add to scored/possible (they are the
+# only ones that can be turned into a percentage), but every attempt counts
+# towards attempts.
+
+ROLLUP_TABLES = ('user_stats', 'user_subject_stats', 'user_topic_stats', 'user_daily_stats')
+
+
+def record_attempt(conn, user_id, score, total_questions, subject=None, topic=None):
+    """
+    Adds one quiz attempt to the user's rollups. subject is the static quiz's
+    subject, topic the AI quiz topic. Does not commit.
+    """
+    graded = bool(total_questions) and int(total_questions) > 0
+    scored = (score or 0) if graded else 0
+    possible = total_questions if graded else 0
+    values = (user_id, scored, possible)
+
+    conn.execute(
+        """
+        INSERT INTO user_stats (user_id, attempts, scored, possible) VALUES (?, 1, ?, ?)
+        ON CONFLICT (user_id) DO UPDATE SET
+            attempts = attempts + 1,
+            scored = scored + excluded.scored,
+            possible = possible + excluded.possible
+        """,
+        values
+    )
+    conn.execute(
+        """
+        INSERT INTO user_daily_stats (user_id, day, attempts, scored, possible) VALUES (?, DATE('now'), 1, ?, ?)
+        ON CONFLICT (user_id, day) DO UPDATE SET
+            attempts = attempts + 1,
+            scored = scored + excluded.scored,
+            possible = possible + excluded.possible
+        """,
+        values
+    )
+    if subject:
+        conn.execute(
+            """
+            INSERT INTO user_subject_stats (user_id, subject, attempts, scored, possible) VALUES (?, ?, 1, ?, ?)
+            ON CONFLICT (user_id, subject) DO UPDATE SET
+                attempts = attempts + 1,
+                scored = scored + excluded.scored,
+                possible = possible + excluded.possible
+            """,
+            (user_id, subject, scored, possible)
+        )
+    if topic:
+        conn.execute(
+            """
+            INSERT INTO user_topic_stats (user_id, topic, attempts, scored, possible) VALUES (?, ?, 1, ?, ?)
+            ON CONFLICT (user_id, topic) DO UPDATE SET
+                attempts = attempts + 1,
+                scored = scored + excluded.scored,
+                possible = possible + excluded.possible
+            """,
+            (user_id, topic, scored, possible)
+        )
+
+
+def delete_user(conn, user_id):
+    """Removes a user's rollups (account deletion). Does not commit."""
+    for table in ROLLUP_TABLES:
+        conn.execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,))
+
+
+def rebuild(conn, user_id=None):
+    """
+    Recomputes the rollups from user_progress for one user, or for everyone
+    if user_id is None. Does not commit.
+    """
+    where = "WHERE p.user_id = ?" if user_id is not None else "WHERE 1"
+    params = (user_id,) if user_id is not None else ()
+    if user_id is not None:
+        delete_user(conn, user_id)
+    else:
+        for table in ROLLUP_TABLES:
+            conn.execute(f'DELETE FROM {table}')
+
+    graded_sums = """
+        COUNT(*),
+        SUM(CASE WHEN p.total_questions > 0 THEN COALESCE(p.score, 0) ELSE 0 END),
+        SUM(CASE WHEN p.total_questions > 0 THEN p.total_questions ELSE 0 END)
+    """
+    conn.execute(
+        f"""
+        INSERT INTO user_stats (user_id, attempts, scored, possible)
+        SELECT p.user_id, {graded_sums}
+        FROM user_progress p {where}
+        GROUP BY p.user_id
+        """,
+        params
+    )
+    conn.execute(
+        f"""
+        INSERT INTO user_daily_stats (user_id, day, attempts, scored, possible)
+        SELECT p.user_id, DATE(p.completed_at), {graded_sums}
+        FROM user_progress p {where}
+        GROUP BY p.user_id, DATE(p.completed_at)
+        """,
+        params
+    )
+    conn.execute(
+        f"""
+        INSERT INTO user_subject_stats (user_id, subject, attempts, scored, possible)
+        SELECT p.user_id, q.subject, {graded_sums}
+        FROM user_progress p JOIN quizzes q ON p.quiz_id = q.id
+        {where}
+        GROUP BY p.user_id, q.subject
+        """,
+        params
+    )
+    conn.execute(
+        f"""
+        INSERT INTO user_topic_stats (user_id, topic, attempts, scored, possible)
+        SELECT p.user_id, p.ai_quiz_topic, {graded_sums}
+        FROM user_progress p
+        {where} AND p.ai_quiz_topic IS NOT NULL AND p.ai_quiz_topic != ''
+        GROUP BY p.user_id, p.ai_quiz_topic
+        """,
+        params
+    )
+
+
+def get_totals(conn, user_id):
+    """Returns {'attempts', 'scored', 'possible'} for all of the user's quizzes."""
+    row = conn.execute(
+        'SELECT attempts, scored, possible FROM user_stats WHERE user_id = ?',
+        (user_id,)
+    ).fetchone()
+    if row is None:
+        return {'attempts': 0, 'scored': 0, 'possible': 0}
+    return dict(row)
+
+
+def get_subject_stats(conn, user_id):
+    """Returns one row (subject, attempts, scored, possible) per static-quiz subject."""
+    return conn.execute(
+        'SELECT subject, attempts, scored, possible FROM user_subject_stats WHERE user_id = ? ORDER BY subject',
+        (user_id,)
+    ).fetchall()
+
+
+def get_topic_stats(conn, user_id):
+    """Returns one row per AI quiz topic with its confidence (0-100), best first."""
+    return conn.execute(
+        """
+        SELECT
+            topic AS ai_quiz_topic,
+            scored AS total_scored,
+            possible AS total_possible,
+            (scored * 100.0 / possible) AS confidence
+        FROM user_topic_stats
+        WHERE user_id = ?
+        ORDER BY confidence DESC
+        """,
+        (user_id,)
+    ).fetchall()
+
+
+def get_recent_days(conn, user_id, limit=10):
+    """Returns the user's last `limit` days with graded quizzes, oldest first."""
+    rows = conn.execute(
+        """
+        SELECT day, attempts, scored, possible FROM user_daily_stats
+        WHERE user_id = ? AND possible > 0
+        ORDER BY day DESC
+        LIMIT ?
+        """,
+        (user_id, limit)
+    ).fetchall()
+    return list(reversed(rows))
+
+
+if __name__ == '__main__':
+    # Usage: python rollups.py [user_id]
+    import db
+    target_user = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    conn = db.connect()
+    try:
+        rebuild(conn, target_user)
+        conn.commit()
+    finally:
+        conn.close()
+    print("Rebuilt stats rollups for " + (f"user {target_user}." if target_user is not None else "all users."))
@@ -0,0 +1,94 @@
+import html
+import re
+import sys
+
+# --- Community Post Search ---
+# posts_fts is an FTS5 index over posts.content, created by migrations.py and
+# kept in sync by triggers on posts. This module builds safe MATCH queries,
+# runs ranked searches, and can rebuild or optimize the index by hand.
+
+SNIPPET_TOKENS = 12
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+_TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def build_match_query(text):
+    """
+    Turns free text from the search box into an FTS5 query: every word must
+    match, and the last one may be a prefix ("ohm la" finds "Ohm's law").
+    Returns None if there is nothing to search for. Quoting each term means
+    user input can never be parsed as FTS5 syntax.
+    """
+    terms = _TERM_PATTERN.findall(text or '')
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return " ".join(quoted)
+
+
+def _render_snippet(snippet):
+    """HTML-escapes a snippet (it is user content) and turns the match markers into <mark> tags."""
+    escaped = html.escape(snippet or '')
+    return escaped.replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def search_posts(conn, match_query, exam_group, channel=None, limit=20, offset=0):
+    """
+    Returns (results, has_more) for posts and replies in an exam group (and
+    optionally one channel), best bm25 match first.
+    """
+    rows = conn.execute(
+        """
+        SELECT
+            p.id, p.parent_post_id, p.channel, p.content, p.media_url, p.created_at,
+            p.user_id, p.reply_count, u.username,
+            snippet(posts_fts, 0, ?, ?, '…', ?) AS snippet,
+            bm25(posts_fts) AS rank
+        FROM posts_fts
+        JOIN posts p ON p.id = posts_fts.rowid
+        JOIN users u ON p.user_id = u.id
+        WHERE posts_fts MATCH ?
+          AND p.exam_group = ?
+          AND (? IS NULL OR p.channel = ?)
+        ORDER BY rank
+        LIMIT ? OFFSET ?
+        """,
+        (_MARK_START, _MARK_END, SNIPPET_TOKENS, match_query, exam_group, channel, channel, limit + 1, offset)
+    ).fetchall()
+
+    results = []
+    for row in rows[:limit]:
+        result = dict(row)
+        result['snippet'] = _render_snippet(result['snippet'])
+        results.append(result)
+    return results, len(rows) > limit
+
+
+def rebuild(conn):
+    """Re-indexes every post from scratch. Does not commit."""
+    conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('rebuild')")
+
+
+def optimize(conn):
+    """Merges the index's b-trees into one, which makes searches faster. Does not commit."""
+    conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('optimize')")
+
+
+if __name__ == '__main__':
+    # Usage: python search_index.py [rebuild|optimize]
+    import db
+    command = sys.argv[1] if len(sys.argv) > 1 else 'rebuild'
+    if command not in ('rebuild', 'optimize'):
+        sys.exit("Usage: python search_index.py [rebuild|optimize]")
+    conn = db.connect()
+    try:
+        if command == 'rebuild':
+            rebuild(conn)
+        else:
+            optimize(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Post search index: {command} done.")
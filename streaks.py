@@ -0,0 +1,122 @@
+import sys
+from datetime import date, timedelta
+
+# --- Study Streaks ---
+# user_activity is an append-only log with one row per user per active day
+# (a completed task or a finished quiz). users.current_streak and
+# users.last_activity_date cache the streak ending on the last active day;
+# they only change when a new day is logged, in one atomic UPDATE.
+# Reads never write: effective_streak() treats a streak whose last day is
+# before yesterday as 0, and the nightly rollover() job resets it in bulk.
+
+
+def record_activity(conn, user_id, day=None):
+    """
+    Logs study activity for the user today (or on `day`) and returns their
+    current streak. Only the first activity of a day touches users. Does not commit.
+    """
+    day = day or date.today()
+    today_str = day.isoformat()
+    yesterday_str = (day - timedelta(days=1)).isoformat()
+
+    result = conn.execute(
+        'INSERT OR IGNORE INTO user_activity (user_id, day) VALUES (?, ?)',
+        (user_id, today_str)
+    )
+    if result.rowcount == 0:
+        # Already active today, so the streak is already up to date
+        row = conn.execute('SELECT current_streak FROM users WHERE id = ?', (user_id,)).fetchone()
+        return row['current_streak'] if row else 0
+
+    row = conn.execute(
+        """
+        UPDATE users SET
+            current_streak = CASE
+                WHEN last_activity_date = ? THEN current_streak + 1
+                WHEN last_activity_date = ? THEN current_streak
+                ELSE 1
+            END,
+            last_activity_date = ?
+        WHERE id = ?
+        RETURNING current_streak
+        """,
+        (yesterday_str, today_str, today_str, user_id)
+    ).fetchone()
+    return row['current_streak'] if row else 0
+
+
+def effective_streak(current_streak, last_activity_date, today=None):
+    """The streak to show: the cached value, or 0 if the user missed a whole day since."""
+    today = today or date.today()
+    if last_activity_date in (today.isoformat(), (today - timedelta(days=1)).isoformat()):
+        return current_streak or 0
+    return 0
+
+
+def rollover(conn, today=None):
+    """
+    Nightly job: resets the cached streak of everyone who was not active
+    yesterday or today. Returns how many users were reset. Does not commit.
+    """
+    today = today or date.today()
+    yesterday_str = (today - timedelta(days=1)).isoformat()
+    result = conn.execute(
+        'UPDATE users SET current_streak = 0 WHERE current_streak > 0 AND last_activity_date < ?',
+        (yesterday_str,)
+    )
+    return result.rowcount
+
+
+def rebuild(conn, today=None):
+    """
+    Recomputes every user's cached streak from the activity log in one
+    statement: the newest run of consecutive days, found with a gaps-and-islands
+    query (day minus its row number is constant within a run). Does not commit.
+    """
+    conn.execute(
+        """
+        WITH runs AS (
+            SELECT user_id, day, julianday(day) - ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY day) AS run_id
+            FROM user_activity
+        ),
+        run_lengths AS (
+            SELECT user_id, COUNT(*) AS length, MAX(day) AS last_day
+            FROM runs
+            GROUP BY user_id, run_id
+        ),
+        latest AS (
+            SELECT user_id, length, last_day,
+                   ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY last_day DESC) AS position
+            FROM run_lengths
+        )
+        UPDATE users
+        SET current_streak = latest.length, last_activity_date = latest.last_day
+        FROM latest
+        WHERE latest.user_id = users.id AND latest.position = 1
+        """
+    )
+    rollover(conn, today)
+
+
+def delete_user(conn, user_id):
+    """Removes a user's activity log (account deletion). Does not commit."""
+    conn.execute('DELETE FROM user_activity WHERE user_id = ?', (user_id,))
+
+
+if __name__ == '__main__':
+    # Usage: python streaks.py rollover   (run daily, just after midnight)
+    #        python streaks.py rebuild    (recompute cached streaks from the activity log)
+    import db
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command not in ('rollover', 'rebuild'):
+        sys.exit("Usage: python streaks.py [rollover|rebuild]")
+    conn = db.connect()
+    try:
+        if command == 'rollover':
+            print(f"Reset {rollover(conn)} expired streaks.")
+        else:
+            rebuild(conn)
+            print("Rebuilt streaks from the activity log.")
+        conn.commit()
+    finally:
+        conn.close()